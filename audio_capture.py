@@ -0,0 +1,139 @@
+import array
+import collections
+import io
+import math
+import struct
+
+# ==========================================
+# GHI ÂM CÓ PHÁT HIỆN GIỌNG NÓI (VAD) - DÙNG CHUNG CHO review.py & voice.py
+# ==========================================
+VAD_THRESHOLD = 500         # RMS (int16) coi là "có tiếng"
+VAD_SILENCE_SECONDS = 1.5   # Im lặng liên tục bao lâu sau khi nói thì tự dừng
+RECORD_MAX_SECONDS = 30     # Dung lượng ring buffer
+VAD_PRE_ROLL_CHUNKS = 3     # Giữ lại vài chunk trước tiếng nói đầu tiên (không mất âm đầu)
+VAD_TAIL_CHUNKS = 3         # Giữ lại vài chunk sau tiếng nói cuối cùng
+
+def rms_int16(data):
+    samples = array.array('h', bytes(data))
+    if not samples: return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+class VoiceActivityRecorder:
+    """Nhận từng chunk PCM 16-bit, ghi vào ring buffer cấp phát sẵn.
+
+    Bỏ im lặng ở đầu, cắt im lặng ở cuối và báo dừng khi im lặng kéo dài
+    quá `silence_seconds`. Khoảng lặng chỉ được ghi khi tiếng nói quay lại,
+    nên im lặng cuối không bao giờ đè lên phần đã nói. Buffer đầy thì ghi đè
+    phần cũ nhất.
+    """
+
+    def __init__(self, rate, chunk, sample_width=2, threshold=VAD_THRESHOLD,
+                 silence_seconds=VAD_SILENCE_SECONDS, max_seconds=RECORD_MAX_SECONDS,
+                 pre_roll_chunks=VAD_PRE_ROLL_CHUNKS, tail_chunks=VAD_TAIL_CHUNKS):
+        self.rate = rate
+        self.sample_width = sample_width
+        self.threshold = threshold
+        self.chunk_bytes = chunk * sample_width
+        self.silence_chunks = max(1, int(silence_seconds * rate / chunk))
+        self.tail_chunks = tail_chunks
+        max_chunks = max(1, int(max_seconds * rate / chunk))
+        self.buffer = bytearray(max_chunks * self.chunk_bytes)
+        self.pre_roll = collections.deque(maxlen=pre_roll_chunks)
+        self.pending = []     # Khoảng lặng sau tiếng nói, chưa biết có nói tiếp không
+        self.written = 0      # Tổng số byte đã ghi (kể cả phần bị ghi đè)
+        self.speech_started = False
+        self.done = False
+
+    @property
+    def has_speech(self):
+        return self.speech_started
+
+    def _write(self, data):
+        size = len(self.buffer)
+        data = memoryview(data)[-size:] # Chunk lớn hơn cả buffer (hiếm) -> giữ phần cuối
+        pos = self.written % size
+        first = min(len(data), size - pos)
+        self.buffer[pos:pos + first] = data[:first]
+        if first < len(data):
+            self.buffer[:len(data) - first] = data[first:]
+        self.written += len(data)
+
+    def feed(self, data):
+        """Trả về False khi nên dừng ghi (đã nói xong)."""
+        if self.done: return False
+        loud = rms_int16(data) >= self.threshold
+        if not self.speech_started:
+            if not loud:
+                self.pre_roll.append(bytes(data))
+                return True
+            self.speech_started = True
+            for chunk in self.pre_roll: self._write(chunk)
+            self.pre_roll.clear()
+        if loud:
+            for chunk in self.pending: self._write(chunk)
+            self.pending.clear()
+            self._write(data)
+        else:
+            self.pending.append(bytes(data))
+            self.done = len(self.pending) >= self.silence_chunks
+        return not self.done
+
+    def pcm(self):
+        """PCM đã cắt im lặng. Không copy nếu buffer chưa bị ghi vòng."""
+        if not self.speech_started: return memoryview(b"")
+        # Giữ một đoạn lặng ngắn ở cuối cho tự nhiên, bỏ phần còn lại.
+        # Chỉ ghi phần còn chỗ trống: buffer đã đầy thì ghi thêm sẽ đè lên tiếng nói mới nhất
+        size = len(self.buffer)
+        for chunk in self.pending[:self.tail_chunks]:
+            if self.written + len(chunk) > size: break
+            self._write(chunk)
+        self.pending.clear()
+        if self.written <= size:
+            return memoryview(self.buffer)[:self.written]
+        # Đã ghi vòng: xoay lại đúng thứ tự thời gian (1 lần copy)
+        pos = self.written % size
+        return memoryview(self.buffer[pos:] + self.buffer[:pos])
+
+# ==========================================
+# ĐÓNG GÓI FILE UPLOAD TRONG RAM (KHÔNG FILE TẠM)
+# ==========================================
+def _soundfile():
+    # Nạp lần đầu cần nén (numpy + soundfile khá nặng, không để làm chậm lúc mở app)
+    try:
+        import numpy as np
+        import soundfile as sf # pip install soundfile (tuỳ chọn, để nén FLAC/Opus)
+        return np, sf
+    except ImportError:
+        return None, None
+
+def wav_header(data_size, rate, channels, sample_width=2):
+    byte_rate = rate * channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1,
+                       channels, rate, byte_rate, channels * sample_width, sample_width * 8,
+                       b'data', data_size)
+
+def encode_wav(pcm, rate, channels, sample_width=2):
+    # 1 lần cấp phát đúng kích thước (header + PCM), PCM chỉ copy 1 lần;
+    # BytesIO dùng chung buffer của bytes nên không copy thêm
+    pcm = memoryview(pcm)
+    data = b"".join((wav_header(pcm.nbytes, rate, channels, sample_width), pcm))
+    return io.BytesIO(data)
+
+def encode_audio(pcm, rate, channels, fmt="wav"):
+    """Trả về (tên file, file-like) để đưa thẳng vào audio.transcriptions.create."""
+    np, sf = _soundfile() if fmt in ("flac", "opus") else (None, None)
+    if sf is not None:
+        try:
+            samples = np.frombuffer(pcm, dtype='<i2').reshape(-1, channels)
+            out = io.BytesIO()
+            if fmt == "flac":
+                sf.write(out, samples, rate, format="FLAC", subtype="PCM_16")
+                name = "speech.flac"
+            else:
+                sf.write(out, samples, rate, format="OGG", subtype="OPUS")
+                name = "speech.ogg"
+            out.seek(0)
+            return name, out
+        except Exception as e:
+            print(f"Không nén được {fmt}, dùng WAV: {e}")
+    return "speech.wav", encode_wav(pcm, rate, channels)
@@ -0,0 +1,76 @@
+import argparse
+import glob
+import io
+import os
+import time
+
+from scoring import score_answer
+from stt_backends import make_backend
+
+# ==========================================
+# BENCHMARK BACKEND STT
+# ==========================================
+# Thư mục fixture: mỗi file abc.wav đi kèm abc.txt chứa câu đúng.
+#   python bench_stt.py fixtures/ --backend stub --backend local --backend groq --key gsk_...
+
+def load_fixtures(folder):
+    fixtures = []
+    for wav_path in sorted(glob.glob(os.path.join(folder, "*.wav"))):
+        txt_path = os.path.splitext(wav_path)[0] + ".txt"
+        if not os.path.exists(txt_path): continue
+        with open(wav_path, "rb") as f: audio = f.read()
+        with open(txt_path, encoding="utf-8") as f: reference = f.read().strip()
+        fixtures.append((os.path.basename(wav_path), audio, reference))
+    return fixtures
+
+def similarity(reference, hypothesis):
+    # Cùng cách chấm như lúc ôn bài
+    return score_answer(reference, hypothesis).score * 100
+
+def run_backend(backend, fixtures, warmup=True):
+    if warmup and fixtures: # Lần đầu (nạp model, mở kết nối) không tính
+        name, audio, _ = fixtures[0]
+        backend.transcribe((name, io.BytesIO(audio)))
+    latencies, scores = [], []
+    for name, audio, reference in fixtures:
+        started = time.perf_counter()
+        result = backend.transcribe((name, io.BytesIO(audio)))
+        latencies.append((time.perf_counter() - started) * 1000)
+        scores.append(similarity(reference, result.text))
+    return latencies, scores
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def build_backend(name, args, fixtures):
+    if name == "groq":
+        from groq import Groq
+        client = Groq(api_key=args.key)
+        return make_backend("groq", client_factory=lambda: client)
+    if name == "local":
+        return make_backend("local", model_size=args.local_model)
+    # stub trả đúng đáp án -> đo chi phí của chính harness
+    return make_backend("stub", responses={n: ref for n, _, ref in fixtures})
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark độ trễ & độ chính xác của backend STT")
+    parser.add_argument("fixtures", help="Thư mục chứa cặp *.wav + *.txt")
+    parser.add_argument("--backend", action="append", choices=["groq", "local", "stub"],
+                        help="Có thể lặp lại; mặc định: stub")
+    parser.add_argument("--key", help="Groq API key (cho backend groq)")
+    parser.add_argument("--local-model", default="base.en", help="Model faster-whisper (cho backend local)")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        parser.error(f"Không có cặp .wav/.txt nào trong {args.fixtures}")
+
+    print(f"{'backend':<8} {'files':>5} {'mean ms':>9} {'p95 ms':>9} {'acc %':>7}")
+    for name in args.backend or ["stub"]:
+        latencies, scores = run_backend(build_backend(name, args, fixtures), fixtures)
+        print(f"{name:<8} {len(fixtures):>5} {sum(latencies) / len(latencies):>9.1f} "
+              f"{percentile(latencies, 95):>9.1f} {sum(scores) / len(scores):>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,92 @@
+import time
+_STARTUP_T0 = time.perf_counter() # Mốc cho --profile-startup
 import customtkinter as ctk
 from tkinter import messagebox
 import datetime
 import threading
 import asyncio
-import edge_tts
-import pygame
 import random
+import collections
+import itertools
+import queue
+import atexit
+import contextlib
+import importlib
+import sys
+import functools
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 import io
-import difflib
+import hashlib
+import mmap
+import argparse
+import json
+import csv
 import os
-import tempfile
-import wave
-import pyaudio # Cần pip install pyaudio
-from deep_translator import GoogleTranslator
 from peewee import *
-from groq import Groq
+from playhouse.migrate import SqliteMigrator, migrate
+from audio_capture import VoiceActivityRecorder, encode_audio
+from stt_backends import make_backend
+from scoring import score_answer, PASS_THRESHOLD
+from srs import CardState, DEFAULT_EASE, quality_from_score, make_strategy, rebalance
+
+# ==========================================
+# ĐO THỜI GIAN KHỞI ĐỘNG & NẠP MODULE NẶNG KHI CẦN
+# ==========================================
+class StartupProfile:
+    """Ghi thời gian từng giai đoạn khởi động; in ra bằng `python review.py --profile-startup`."""
+
+    def __init__(self, started):
+        self.started = self._last = started
+        self.phases = [] # (tên, ms, là import lười)
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self._last) * 1000, False))
+        self._last = now
+
+    def record_import(self, name, seconds):
+        # Import lười nằm bên trong 1 giai đoạn -> in thụt lề, không cộng thêm vào tổng
+        self.phases.append((f"import {name}", seconds * 1000, True))
+
+    def report(self):
+        lines = [f"{'  ' if nested else ''}{name:<{44 if nested else 46}} {ms:8.1f} ms" for name, ms, nested in self.phases]
+        lines.append(f"{'TỔNG':<46} {(self._last - self.started) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+startup_profile = StartupProfile(_STARTUP_T0)
+startup_profile.mark("import (customtkinter, peewee, module nội bộ)")
+
+def lazy_import(name):
+    """pygame / pyaudio / groq / deep_translator chỉ nạp ở lần dùng đầu tiên."""
+    module = sys.modules.get(name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        startup_profile.record_import(name, time.perf_counter() - started)
+    return module
 
 # ==========================================
 # 1. CẤU HÌNH DATABASE & AUDIO
 # ==========================================
-db = SqliteDatabase('english_pro.db')
+DB_PATH = 'english_pro.db'
+# WAL: đọc (UI) không bị chặn bởi ghi (luồng nền); NORMAL vẫn an toàn với WAL, chỉ bớt fsync
+DB_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 1,            # NORMAL
+    'cache_size': -16 * 1024,    # 16 MB page cache mỗi kết nối
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 2,             # MEMORY
+    'busy_timeout': 5000,        # ms chờ khoá thay vì báo "database is locked" ngay
+}
+# Peewee giữ 1 kết nối riêng cho mỗi luồng (thread_safe mặc định)
+db = SqliteDatabase(DB_PATH, pragmas=DB_PRAGMAS, timeout=5)
 # Cấu hình Audio cho Groq Whisper (Bắt buộc 16kHz)
 AUDIO_RATE = 16000     
 AUDIO_CHANNELS = 1
 AUDIO_CHUNK = 1024
+UPLOAD_FORMAT = "flac" # "wav" | "flac" | "opus" (flac/opus cần soundfile, thiếu thì tự về wav)
+TTS_VOICE = "Gail-PlayAI"
 
 class BaseModel(Model):
     class Meta:
@@ -34,12 +97,16 @@ class Sentence(BaseModel):
     meaning = TextField(null=True)
     level = IntegerField(default=0)
     next_review = DateField(default=datetime.date.today)
+    interval_days = IntegerField(default=0)
+    ease = FloatField(default=DEFAULT_EASE)
 
 class Vocabulary(BaseModel):
     word = TextField(unique=True)
     meaning = TextField(null=True)
     level = IntegerField(default=0)
     next_review = DateField(default=datetime.date.today)
+    interval_days = IntegerField(default=0)
+    ease = FloatField(default=DEFAULT_EASE)
 
 class Settings(BaseModel):
     key = CharField(unique=True) 
@@ -49,9 +116,1507 @@ class AudioCache(BaseModel):
     text = TextField(unique=True)
     data = BlobField()
     creatated_at = DateTimeField(default=datetime.datetime.now)
+    size = IntegerField(default=0)
+    last_access = DateTimeField(default=datetime.datetime.now)
+    digest = CharField(null=True) # Có giá trị -> data nằm trong AudioFileStore, cột data để trống
+
+class LLMCache(BaseModel):
+    key = CharField(unique=True) # sha256(model + prompt đã chuẩn hoá)
+    model = CharField()
+    response = TextField()
+    created_at = DateTimeField(default=datetime.datetime.now)
+    last_access = DateTimeField(default=datetime.datetime.now, index=True)
+    hits = IntegerField(default=0)
+
+class TranslationCache(BaseModel):
+    key = CharField(unique=True) # sha256(source, target, text)
+    result = TextField()
+    created_at = DateTimeField(default=datetime.datetime.now)
+
+class ReviewLog(BaseModel):
+    kind = CharField() # "sentence" | "vocab"
+    item_id = IntegerField()
+    reviewed_at = DateTimeField(default=datetime.datetime.now)
+    score = FloatField()
+    quality = IntegerField()
+    strategy = CharField()
+    level = IntegerField()
+    interval_days = IntegerField()
+    ease = FloatField()
+    logprob = FloatField(null=True)       # Độ tự tin giọng nói (Whisper avg_logprob) nếu trả lời bằng mic
+    latency_ms = IntegerField(null=True)  # Từ lúc hiện thẻ tới lúc trả lời
+
+    class Meta:
+        indexes = ((("kind", "item_id"), False),)
+
+class SchemaMigration(BaseModel):
+    version = IntegerField(unique=True)
+    name = CharField()
+    applied_at = DateTimeField(default=datetime.datetime.now)
+
+# --- MIGRATIONS (Đánh số tăng dần, KHÔNG sửa migration đã chạy) ---
+def _m001_due_indexes():
+    # Index cho truy vấn "đến hạn ôn": WHERE next_review <= today
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "sentence_next_review_level" ON "sentence" ("next_review", "level")')
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "vocabulary_next_review_level" ON "vocabulary" ("next_review", "level")')
+
+def _add_column_if_missing(table, name, field):
+    # DB mới tạo bằng create_tables đã có sẵn cột -> bỏ qua
+    if name not in {c.name for c in db.get_columns(table)}:
+        migrate(SqliteMigrator(db).add_column(table, name, field))
+
+def _m002_audio_cache_lru():
+    _add_column_if_missing("audiocache", "size", IntegerField(default=0))
+    _add_column_if_missing("audiocache", "last_access", DateTimeField(null=True))
+    db.execute_sql('UPDATE "audiocache" SET "size" = length("data") WHERE "size" = 0')
+    db.execute_sql('UPDATE "audiocache" SET "last_access" = "creatated_at" WHERE "last_access" IS NULL')
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "audiocache_last_access" ON "audiocache" ("last_access")')
+
+def _m003_audio_cache_digest():
+    _add_column_if_missing("audiocache", "digest", CharField(null=True))
+
+def _m004_srs_columns():
+    for table in ("sentence", "vocabulary"):
+        _add_column_if_missing(table, "interval_days", IntegerField(default=0))
+        _add_column_if_missing(table, "ease", FloatField(default=DEFAULT_EASE))
+        # Thẻ cũ: khoảng cách hiện tại theo luật nhân đôi 2^(level-1)
+        db.execute_sql(f'UPDATE "{table}" SET "interval_days" = 1 << ("level" - 1) '
+                       f'WHERE "level" > 0 AND "interval_days" = 0')
+
+def _m005_review_log_voice():
+    _add_column_if_missing("reviewlog", "logprob", FloatField(null=True))
+    _add_column_if_missing("reviewlog", "latency_ms", IntegerField(null=True))
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "reviewlog_reviewed_at" ON "reviewlog" ("reviewed_at")')
+
+MIGRATIONS = [
+    (1, "due_indexes", _m001_due_indexes),
+    (2, "audio_cache_lru", _m002_audio_cache_lru),
+    (3, "audio_cache_digest", _m003_audio_cache_digest),
+    (4, "srs_columns", _m004_srs_columns),
+    (5, "review_log_voice", _m005_review_log_voice),
+]
+
+def run_migrations():
+    applied = {m.version for m in SchemaMigration.select(SchemaMigration.version)}
+    for version, name, func in MIGRATIONS:
+        if version in applied: continue
+        with db.atomic():
+            func()
+            SchemaMigration.create(version=version, name=name)
+        print(f"🛠️ Đã chạy migration {version:03d}_{name}")
 
 db.connect()
-db.create_tables([Sentence, Vocabulary, Settings, AudioCache], safe=True)
+db.create_tables([Sentence, Vocabulary, Settings, AudioCache, LLMCache, TranslationCache, ReviewLog, SchemaMigration], safe=True)
+run_migrations()
+startup_profile.mark("db: kết nối + tạo bảng + migration")
+
+# ==========================================
+# --- LUỒNG GHI DB DUY NHẤT (MỌI GHI TỪ LUỒNG NỀN / UI ĐI QUA ĐÂY) ---
+# ==========================================
+class DatabaseWriter:
+    """Hàng đợi ghi: 1 luồng duy nhất giữ khoá ghi, nên các luồng khác không tranh nhau khoá.
+
+    submit(fn) -> Future (không chờ, dùng cho UI); call(fn) chờ kết quả (dùng cho luồng nền).
+    Mỗi job chạy trong 1 transaction riêng; lỗi được in ra và trả về qua Future.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None: break
+            fn, args, kwargs, future = job
+            if not future.set_running_or_notify_cancel(): continue
+            try:
+                with db.atomic():
+                    result = fn(*args, **kwargs)
+                future.set_result(result)
+            except Exception as e:
+                print(f"Lỗi ghi DB ({getattr(fn, '__name__', fn)}): {e}")
+                future.set_exception(e)
+        db.close()
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        if threading.current_thread() is self._thread: # Job lồng nhau: chạy luôn, tránh tự chờ mình
+            try: future.set_result(fn(*args, **kwargs))
+            except Exception as e: future.set_exception(e)
+            return future
+        self._ensure_thread()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    def flush(self):
+        # Chờ mọi job đã xếp hàng ghi xong
+        if self._thread is not None and self._thread.is_alive():
+            self.call(lambda: None)
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+db_writer = DatabaseWriter()
+atexit.register(db_writer.stop)
+
+BULK_INSERT_BATCH = 100 # Số row mỗi câu INSERT (giữ số tham số dưới giới hạn SQLite)
+
+def _insert_many_ignore(model, rows, batch_size):
+    conn = db.connection()
+    before = conn.total_changes
+    for i in range(0, len(rows), batch_size):
+        model.insert_many(rows[i:i + batch_size]).on_conflict_ignore().execute()
+    return conn.total_changes - before
+
+def insert_many_ignore(model, rows, batch_size=BULK_INSERT_BATCH):
+    """INSERT ... ON CONFLICT IGNORE theo lô trong 1 transaction (qua db_writer). Trả về số dòng thực sự thêm."""
+    if not rows: return 0
+    inserted = db_writer.call(_insert_many_ignore, model, rows, batch_size)
+    deck_stats.added(model, inserted) # Bảng khác (cache) không được đếm -> bỏ qua
+    return inserted
+
+# ==========================================
+# --- HÀNG ĐỢI ÔN TẬP (CHỈ LẤY ID, NẠP DẦN THEO LÔ) ---
+# ==========================================
+REVIEW_BATCH_SIZE = 20
+
+class ReviewQueue:
+    """Hàng đợi ôn tập lười: chỉ giữ danh sách id, nạp model theo lô khi cần."""
+
+    def __init__(self, model, ids, batch_size=REVIEW_BATCH_SIZE):
+        self.model = model
+        self.ids = collections.deque(ids)
+        self.batch_size = batch_size
+        self._rows = {}
+
+    @classmethod
+    def due(cls, model, strategy="shuffle", seed=None, today=None, batch_size=REVIEW_BATCH_SIZE):
+        today = today or datetime.date.today()
+        query = model.select(model.id).where(model.next_review <= today)
+        if strategy == "oldest":
+            query = query.order_by(model.next_review, model.level, model.id)
+        ids = [row[0] for row in query.tuples()]
+        if strategy == "shuffle":
+            random.Random(seed).shuffle(ids)
+        return cls(model, ids, batch_size)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def _hydrate(self, count):
+        missing = [i for i in itertools.islice(self.ids, count) if i not in self._rows]
+        if not missing: return
+        for row in self.model.select().where(self.model.id.in_(missing)):
+            self._rows[row.id] = row
+        # Item bị xoá giữa chừng -> bỏ khỏi hàng đợi
+        for i in missing:
+            if i not in self._rows: self.ids.remove(i)
+
+    def current(self):
+        while self.ids:
+            if self.ids[0] not in self._rows:
+                self._hydrate(self.batch_size)
+            if self.ids and self.ids[0] in self._rows:
+                return self._rows[self.ids[0]]
+        return None
+
+    def upcoming(self, n):
+        self._hydrate(n)
+        return [self._rows[i] for i in itertools.islice(self.ids, n) if i in self._rows]
+
+    def upcoming_ids(self, n):
+        # Chỉ id, không nạp model (dùng được ở luồng Tk)
+        return list(itertools.islice(self.ids, n))
+
+    def pop(self):
+        item_id = self.ids.popleft()
+        return self._rows.pop(item_id, None)
+
+    def requeue(self):
+        # Đưa item hiện tại xuống cuối hàng (giữ nguyên object đã nạp)
+        self.ids.rotate(-1)
+
+# ==========================================
+# --- LỊCH ÔN (SRS): Settings "srs_strategy" = doubling (mặc định) | sm2 ---
+# ==========================================
+REVIEW_KINDS = {Sentence: "sentence", Vocabulary: "vocab"}
+REBALANCE_UPDATE_BATCH = 200
+REVIEW_LOG_FLUSH_SECONDS = 30 # Ghi lịch sử ôn theo lô mỗi 30 giây...
+REVIEW_LOG_FLUSH_ROWS = 50    # ... hoặc khi đủ 50 lượt
+
+class ReviewLogBuffer:
+    """Write-behind cho ReviewLog: trả lời chỉ append vào RAM, ghi DB theo lô (1 transaction/lô).
+
+    Flush định kỳ ở luồng nền, khi đủ `max_rows`, và lúc thoát app (atexit).
+    """
+
+    def __init__(self, interval=REVIEW_LOG_FLUSH_SECONDS, max_rows=REVIEW_LOG_FLUSH_ROWS):
+        self.interval = interval
+        self.max_rows = max_rows
+        self._rows = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="review-log", daemon=True)
+        self._thread.start()
+
+    def add(self, **row):
+        row.setdefault("reviewed_at", datetime.datetime.now())
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+        if full: self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush(wait=False)
+
+    def flush(self, wait=True):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows: return 0
+        future = db_writer.submit(_insert_many_ignore, ReviewLog, rows, BULK_INSERT_BATCH)
+        if wait: future.result()
+        return len(rows)
+
+review_log = ReviewLogBuffer()
+atexit.register(review_log.flush) # Đăng ký sau db_writer -> chạy trước khi db_writer dừng
+
+def save_setting(key, value):
+    # Gọi từ luồng nền (tasks "db"), không gọi ở luồng Tk
+    db_writer.call(Settings.replace(key=key, value=value).execute)
+
+def get_srs_strategy():
+    try: name = Settings.get(Settings.key == "srs_strategy").value
+    except Settings.DoesNotExist: name = "doubling"
+    try: return make_strategy(name)
+    except ValueError as e:
+        print(e)
+        return make_strategy("doubling")
+
+def review_card(item, score, passed, strategy=None, today=None, logprob=None, latency_ms=None):
+    """Áp dụng chiến lược lên 1 thẻ (đổi item tại chỗ). Lịch mới ghi qua db_writer, log qua review_log."""
+    model = type(item)
+    strategy = strategy or get_srs_strategy()
+    old_day = item.next_review
+    quality = quality_from_score(score, passed)
+    state = strategy.review(CardState(item.level, item.interval_days, item.ease, item.next_review), quality, today)
+    item.level, item.interval_days, item.ease, item.next_review = state
+
+    db_writer.submit(item.save, only=[model.level, model.interval_days, model.ease, model.next_review])
+    review_log.add(kind=REVIEW_KINDS[model], item_id=item.id, score=score, quality=quality,
+                   strategy=strategy.name, level=state.level, interval_days=state.interval, ease=state.ease,
+                   logprob=logprob, latency_ms=latency_ms)
+    deck_stats.rescheduled(model, old_day, item.next_review)
+    return state
+
+def rebalance_deck(models=(Sentence, Vocabulary), today=None):
+    """Dàn đều ngày ôn của cả kho (1 lượt đọc + bulk_update mỗi bảng). Trả về số thẻ được dời."""
+    today = today or datetime.date.today()
+    total = 0
+    for model in models:
+        cards = (model.select(model.id, model.next_review, model.interval_days)
+                 .where(model.next_review > today).tuples())
+        moved = rebalance(cards.iterator(), today)
+        if not moved: continue
+        rows = [model(id=card_id, next_review=due) for card_id, due in moved.items()]
+        db_writer.call(model.bulk_update, rows, fields=[model.next_review], batch_size=REBALANCE_UPDATE_BATCH)
+        total += len(moved)
+    deck_stats.reconcile()
+    return total
+
+# --- DỰ BÁO KHỐI LƯỢNG ÔN (1 TRUY VẤN GROUP BY MỖI BẢNG, DÙNG INDEX next_review+level) ---
+FORECAST_DAYS = 14
+
+def due_forecast(model, days=FORECAST_DAYS, today=None):
+    """{ngày: Counter({level: số thẻ})} cho `days` ngày tới; thẻ quá hạn tính vào hôm nay."""
+    if days < 1: raise ValueError(f"Số ngày dự báo phải >= 1 (nhận {days})")
+    today = today or datetime.date.today()
+    horizon = today + datetime.timedelta(days=days)
+    day = fn.MAX(model.next_review, today) # MAX 2 tham số của SQLite: dồn quá hạn về hôm nay
+    query = (model.select(day.alias("day"), model.level, fn.COUNT(model.id))
+             .where(model.next_review < horizon)
+             .group_by(day, model.level).tuples())
+    forecast = {today + datetime.timedelta(days=d): collections.Counter() for d in range(days)}
+    for due, level, count in query:
+        if isinstance(due, str): due = datetime.date.fromisoformat(due)
+        forecast[due][level] += count
+    return forecast
+
+def forecast_report(days=FORECAST_DAYS, width=40):
+    lines = []
+    for model in (Sentence, Vocabulary):
+        forecast = due_forecast(model, days)
+        peak = max((sum(c.values()) for c in forecast.values()), default=0) or 1
+        lines.append(f"[{REVIEW_KINDS[model].upper()}] {days} ngày tới")
+        for day, levels in forecast.items():
+            total = sum(levels.values())
+            by_level = " ".join(f"L{lv}:{n}" for lv, n in sorted(levels.items()))
+            lines.append(f"  {day:%a %d/%m} {total:>6} {'█' * round(total / peak * width):<{width}} {by_level}".rstrip())
+    return "\n".join(lines)
+
+# ==========================================
+# --- THỐNG KÊ SIDEBAR (ĐẾM TRONG RAM, ĐỐI CHIẾU ĐỊNH KỲ VỚI DB) ---
+# ==========================================
+STATS_RECONCILE_MS = 5 * 60 * 1000 # Đếm lại từ DB mỗi 5 phút (bắt các thay đổi ngoài app)
+
+class DeckStats:
+    """Tổng số và số thẻ theo ngày ôn (next_review) của mỗi bảng, cập nhật tăng dần khi thêm/đổi lịch.
+
+    Đọc snapshot() không chạm DB; reconcile() đếm lại bằng 1 truy vấn GROUP BY mỗi bảng.
+    """
+
+    def __init__(self, models=(Sentence, Vocabulary)):
+        self.models = models
+        self._lock = threading.Lock()
+        self._by_day = None # model -> Counter({next_review: số thẻ})
+
+    @property
+    def loaded(self):
+        return self._by_day is not None
+
+    def reconcile(self):
+        by_day = {}
+        for model in self.models:
+            query = (model.select(model.next_review, fn.COUNT(model.id))
+                     .group_by(model.next_review).tuples())
+            by_day[model] = collections.Counter(dict(query))
+        with self._lock: self._by_day = by_day
+
+    def added(self, model, count, day=None):
+        with self._lock:
+            if self._by_day is None or model not in self._by_day or not count: return
+            self._by_day[model][day or datetime.date.today()] += count
+
+    def rescheduled(self, model, old_day, new_day):
+        with self._lock:
+            if self._by_day is None or model not in self._by_day or old_day == new_day: return
+            counts = self._by_day[model]
+            counts[old_day] -= 1
+            if counts[old_day] <= 0: del counts[old_day]
+            counts[new_day] += 1
+
+    def snapshot(self, model, today=None):
+        """(tổng, cần ôn hôm nay) hoặc None nếu chưa đếm lần nào."""
+        today = today or datetime.date.today()
+        with self._lock:
+            if self._by_day is None: return None
+            counts = self._by_day[model]
+            return sum(counts.values()), sum(n for day, n in counts.items() if day <= today)
+
+deck_stats = DeckStats()
+
+# ==========================================
+# --- KHO AUDIO TRÊN ĐĨA (CONTENT-ADDRESSED, ĐỌC BẰNG MMAP) ---
+# ==========================================
+def audio_digest(text, voice=TTS_VOICE):
+    return hashlib.sha256(f"{voice}\0{text}".encode("utf-8")).hexdigest()
+
+class AudioFileStore:
+    """Mỗi clip là 1 file <root>/<2 ký tự đầu>/<digest>.mp3, SQLite chỉ giữ metadata."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest + ".mp3")
+
+    def write(self, digest, data):
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path) # Ghi nguyên tử, không bao giờ đọc phải file dở dang
+
+    def read(self, digest):
+        # Trả về mmap (read-only): dùng được như bytes/file mà không copy cả clip vào RAM
+        try:
+            with open(self.path(digest), "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None # File mất hoặc rỗng
+
+    def delete(self, digest):
+        try: os.remove(self.path(digest))
+        except OSError: pass
+
+def get_audio_store():
+    try: root = Settings.get(Settings.key == "audio_store_dir").value
+    except Settings.DoesNotExist: return None
+    return AudioFileStore(root) if root else None
+
+AUDIO_MIGRATE_BATCH = 200
+
+def migrate_audio_cache_to_store(store, batch_size=AUDIO_MIGRATE_BATCH):
+    """Chuyển các blob AudioCache cũ ra AudioFileStore theo lô; bị ngắt thì chạy lại được."""
+    moved = 0
+    while True:
+        rows = list(AudioCache.select(AudioCache.id, AudioCache.text, AudioCache.data)
+                    .where(AudioCache.digest.is_null(), fn.length(AudioCache.data) > 0)
+                    .order_by(AudioCache.id).limit(batch_size))
+        if not rows: break
+        with db.atomic():
+            for row in rows:
+                digest = audio_digest(row.text)
+                store.write(digest, row.data)
+                (AudioCache.update(data=b"", digest=digest, size=len(row.data))
+                 .where(AudioCache.id == row.id).execute())
+        moved += len(rows)
+        print(f"📦 Đã chuyển {moved} clip ra {store.root}")
+    Settings.replace(key="audio_store_dir", value=store.root).execute()
+    db.execute_sql("VACUUM") # Trả lại dung lượng blob cho hệ điều hành
+    return moved
+
+# ==========================================
+# --- AUDIO CACHE CÓ GIỚI HẠN DUNG LƯỢNG (LRU) ---
+# ==========================================
+AUDIO_CACHE_MAX_MB = 200        # Ghi đè bằng Settings "audio_cache_max_mb"
+AUDIO_CACHE_LOW_WATERMARK = 0.9 # Dọn tới 90% ngân sách để không phải dọn liên tục
+AUDIO_CACHE_EVICT_PAGE = 500
+AUDIO_INSERT_BATCH = 50      # 5 cột/row -> 250 tham số, dưới giới hạn 999 của SQLite cũ
+
+class AudioCacheManager:
+    """Bọc bảng AudioCache: cập nhật last_access, dọn LRU theo lô, đếm hit/miss."""
+
+    def __init__(self, max_bytes=None, store=None):
+        self._max_bytes = max_bytes
+        self.store = store
+        self._lock = threading.Lock()
+        self._total = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0}
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None: return self._max_bytes
+        try: mb = float(Settings.get(Settings.key == "audio_cache_max_mb").value)
+        except (Settings.DoesNotExist, ValueError): mb = AUDIO_CACHE_MAX_MB
+        return int(mb * 1024 * 1024)
+
+    def contains(self, text):
+        # Không tính vào hit/miss, không chạm last_access
+        return AudioCache.select(AudioCache.id).where(AudioCache.text == text).exists()
+
+    def total_bytes(self):
+        with self._lock:
+            if self._total is None:
+                self._total = AudioCache.select(fn.COALESCE(fn.SUM(AudioCache.size), 0)).scalar()
+            return self._total
+
+    def _file_store(self):
+        # Kho file có thể được cấu hình sau khi tạo manager (vd. --migrate-audio lúc app đang mở) -> đọc lại
+        if self.store is None: self.store = get_audio_store()
+        return self.store
+
+    def get(self, text):
+        row = (AudioCache.select(AudioCache.id, AudioCache.data, AudioCache.digest)
+               .where(AudioCache.text == text).first())
+        data = row.data if row else None
+        if row and row.digest:
+            store = self._file_store()
+            data = store.read(row.digest) if store else None
+            if data is None and store: # File trên đĩa bị mất -> coi như miss, xoá metadata mồ côi
+                db_writer.submit(AudioCache.delete().where(AudioCache.id == row.id).execute)
+                with self._lock: self._total = None
+        with self._lock:
+            self.stats["hits" if data is not None else "misses"] += 1
+        if data is None: return None
+        # Cập nhật LRU không cần chờ
+        db_writer.submit(AudioCache.update(last_access=datetime.datetime.now()).where(AudioCache.id == row.id).execute)
+        return data
+
+    def _row(self, text, data):
+        row = {"text": text, "data": data, "size": len(data)}
+        if self.store:
+            row["digest"] = audio_digest(text)
+            row["data"] = b""
+            self.store.write(row["digest"], data)
+        return row
+
+    def put_many(self, items, evict=True):
+        # Ghi cả lô trong 1 transaction, dọn LRU 1 lần ở cuối (evict=False: bên gọi tự lo ngân sách)
+        rows = [self._row(text, data) for text, data in items]
+        insert_many_ignore(AudioCache, rows, AUDIO_INSERT_BATCH)
+        with self._lock: self._total = None
+        if evict and self.total_bytes() > self.max_bytes: self.evict()
+
+    def put(self, text, data):
+        row = self._row(text, data)
+        if not insert_many_ignore(AudioCache, [row]): return # Luồng khác đã lưu trước
+        self.total_bytes()
+        with self._lock:
+            self._total += len(data)
+            over = self._total > self.max_bytes
+        if over: self.evict()
+
+    def evict(self):
+        budget = self.max_bytes
+        with self._lock:
+            total = AudioCache.select(fn.COALESCE(fn.SUM(AudioCache.size), 0)).scalar()
+            target = int(budget * AUDIO_CACHE_LOW_WATERMARK)
+            freed, victims, digests = 0, [], []
+            if total > budget:
+                store = self._file_store()
+                query = (AudioCache.select(AudioCache.id, AudioCache.size, AudioCache.digest)
+                         .order_by(AudioCache.last_access).tuples())
+                for row_id, size, digest in query.iterator():
+                    if total - freed <= target: break
+                    if digest and not store: continue # Không biết kho file -> xoá row là bỏ rơi file
+                    victims.append(row_id)
+                    if digest: digests.append(digest)
+                    freed += size
+            def delete_victims():
+                for i in range(0, len(victims), AUDIO_CACHE_EVICT_PAGE):
+                    chunk = victims[i:i + AUDIO_CACHE_EVICT_PAGE]
+                    AudioCache.delete().where(AudioCache.id.in_(chunk)).execute()
+            if victims: db_writer.call(delete_victims)
+            if self.store:
+                for digest in digests: self.store.delete(digest)
+            self._total = total - freed
+            self.stats["evictions"] += len(victims)
+            self.stats["evicted_bytes"] += freed
+        return len(victims)
+
+    def report(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups * 100 if lookups else 0
+        return (f"Audio cache: {self.total_bytes() / 1048576:.1f}/{self.max_bytes / 1048576:.0f} MB | "
+                f"hit {self.stats['hits']} / miss {self.stats['misses']} ({rate:.0f}%) | "
+                f"evict {self.stats['evictions']}")
+
+audio_cache = AudioCacheManager(store=get_audio_store())
+
+# ==========================================
+# --- TẦNG MẠNG ASYNCIO (MỌI REQUEST RA NGOÀI ĐI QUA 1 EVENT LOOP) ---
+# ==========================================
+NET_CONCURRENCY = 16      # Tổng số request mạng đồng thời (Groq + gTTS + dịch)
+NET_TIMEOUT = 60          # Giây cho mỗi request
+NET_BLOCKING_THREADS = 8  # Luồng cho thư viện chỉ có API đồng bộ (gTTS, deep_translator, STT)
+
+class NetworkLoop:
+    """1 event loop asyncio chạy ở luồng nền.
+
+    - request()/blocking(): 1 lời gọi mạng, giữ 1 slot của semaphore chung + timeout.
+    - offload(): việc đồng bộ không phải mạng (đọc/ghi DB) -> executor, không chiếm slot.
+    - submit()/run()/map(): đưa coroutine điều phối vào loop từ luồng bất kỳ;
+      submit trả về concurrent.futures.Future, cancel() huỷ luôn request đang chờ.
+    - stop(): huỷ mọi Future còn dở (luồng đang chờ run() được nhả ngay), sau đó submit() báo lỗi.
+    """
+
+    def __init__(self, concurrency=NET_CONCURRENCY, timeout=NET_TIMEOUT, blocking_threads=NET_BLOCKING_THREADS):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=blocking_threads, thread_name_prefix="net-blocking"))
+        self._concurrency = concurrency
+        self._sem = None
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._stopped = False
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="net-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        # Semaphore phải tạo trong loop của nó (Python 3.8/3.9 gắn vào loop hiện hành lúc tạo)
+        asyncio.set_event_loop(self.loop)
+        self._sem = asyncio.Semaphore(self._concurrency)
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def request(self, coro, timeout=None):
+        async with self._sem:
+            return await asyncio.wait_for(coro, timeout or self.timeout)
+
+    async def blocking(self, fn, *args, timeout=None):
+        # Giữ slot trước rồi mới đưa vào executor -> giới hạn chung có hiệu lực, timeout tính từ lúc chạy.
+        # Hết giờ thì bỏ chờ; luồng executor vẫn chạy nốt nhưng không giữ slot
+        async with self._sem:
+            return await asyncio.wait_for(self.loop.run_in_executor(None, functools.partial(fn, *args)),
+                                          timeout or self.timeout)
+
+    async def offload(self, fn, *args):
+        return await self.loop.run_in_executor(None, functools.partial(fn, *args))
+
+    def submit(self, coro):
+        with self._lock:
+            if self._stopped:
+                coro.close()
+                raise RuntimeError("NetworkLoop đã dừng")
+            future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock: self._futures.discard(future)
+
+    def run(self, coro, timeout=None):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("NetworkLoop.run() gọi từ trong loop -> dùng await")
+        return self.submit(coro).result(timeout)
+
+    def map(self, fn, items, limit=None):
+        """Chạy coroutine fn(item) cho mọi item cùng lúc (tối đa `limit`), giữ thứ tự kết quả."""
+        async def gather():
+            sem = asyncio.Semaphore(limit) if limit else None
+            async def one(item):
+                if sem is None: return await fn(item)
+                async with sem: return await fn(item)
+            return await asyncio.gather(*(one(item) for item in items))
+        return self.run(gather())
+
+    def stop(self):
+        # Loop dừng thì các Future còn dở không bao giờ xong -> huỷ trước để không luồng nào kẹt ở result()
+        with self._lock:
+            if self._stopped: return
+            self._stopped = True
+            pending, self._futures = self._futures, set()
+        for future in pending: future.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+net = NetworkLoop()
+
+# ==========================================
+# --- TTS: GROQ -> GOOGLE (DÙNG CHUNG CHO UI & PREFETCH) ---
+# ==========================================
+class GroqClientProvider:
+    """1 client Groq dùng chung (giữ kết nối keep-alive), tự làm mới khi đổi key."""
+
+    _UNSET = object()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = self._UNSET
+        self._client = None
+        self._client_key = None
+        self._async_client = None
+        self._async_client_key = None
+        self.metrics = {} # endpoint -> {"calls", "errors", "total_ms", "max_ms"}
+
+    def key(self):
+        with self._lock:
+            if self._key is self._UNSET:
+                try: self._key = Settings.get(Settings.key == "groq").value or None
+                except Settings.DoesNotExist: self._key = None
+            return self._key
+
+    def client(self, key=None):
+        key = key or self.key()
+        with self._lock:
+            if self._client is None or self._client_key != key:
+                if self._client is not None:
+                    try: self._client.close()
+                    except Exception: pass
+                self._client = lazy_import("groq").Groq(api_key=key)
+                self._client_key = key
+            return self._client
+
+    def async_client(self, key=None):
+        # Chỉ dùng trong net.loop (AsyncGroq gắn với event loop tạo ra nó)
+        key = key or self.key()
+        with self._lock:
+            if self._async_client is None or self._async_client_key != key:
+                self._async_client = lazy_import("groq").AsyncGroq(api_key=key)
+                self._async_client_key = key
+            return self._async_client
+
+    def invalidate(self):
+        # Gọi sau khi lưu key mới trong Cài đặt
+        with self._lock:
+            self._key = self._UNSET
+
+    @contextlib.contextmanager
+    def timed(self, endpoint):
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                m = self.metrics.setdefault(endpoint, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+                m["calls"] += 1
+                m["errors"] += 0 if ok else 1
+                m["total_ms"] += ms
+                m["max_ms"] = max(m["max_ms"], ms)
+
+    def report(self):
+        with self._lock:
+            lines = [f"{name}: {m['calls']} lần, TB {m['total_ms'] / m['calls']:.0f} ms, "
+                     f"max {m['max_ms']:.0f} ms, lỗi {m['errors']}"
+                     for name, m in sorted(self.metrics.items())]
+        return "\n".join(lines) or "Chưa có request Groq nào."
+
+groq_clients = GroqClientProvider()
+
+def get_groq_key():
+    return groq_clients.key()
+
+# --- CHAT GROQ CÓ CACHE (MỌI PROMPT ĐỀU ĐI QUA ĐÂY) ---
+CHAT_MODEL = "openai/gpt-oss-120b"
+LLM_CACHE_TTL_DAYS = 30
+LLM_CACHE_MAX_ROWS = 5000
+
+class LLMResponseCache:
+    """Cache câu trả lời LLM trong DB: khoá theo model + prompt, có TTL và giới hạn số dòng (LRU)."""
+
+    def __init__(self, ttl_days=LLM_CACHE_TTL_DAYS, max_rows=LLM_CACHE_MAX_ROWS):
+        self.ttl = datetime.timedelta(days=ttl_days)
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(model, prompt):
+        # Prompt viết bằng triple-quote thụt lề khác nhau vẫn ra cùng khoá
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, model, prompt):
+        key = self.make_key(model, prompt)
+        row = LLMCache.get_or_none(LLMCache.key == key)
+        now = datetime.datetime.now()
+        if row and now - row.created_at > self.ttl:
+            db_writer.submit(LLMCache.delete().where(LLMCache.id == row.id).execute)
+            row = None
+        with self._lock:
+            self.stats["hits" if row else "misses"] += 1
+        if not row: return None
+        db_writer.submit(LLMCache.update(last_access=now, hits=LLMCache.hits + 1)
+                         .where(LLMCache.id == row.id).execute)
+        return row.response
+
+    def _put(self, model, prompt, response):
+        LLMCache.replace(key=self.make_key(model, prompt), model=model, response=response).execute()
+        overflow = LLMCache.select().count() - self.max_rows
+        if overflow > 0:
+            oldest = LLMCache.select(LLMCache.id).order_by(LLMCache.last_access).limit(overflow)
+            LLMCache.delete().where(LLMCache.id.in_(oldest)).execute()
+            with self._lock: self.stats["evictions"] += overflow
+
+    def put(self, model, prompt, response):
+        db_writer.submit(self._put, model, prompt, response)
+
+    def report(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups * 100 if lookups else 0
+        return (f"LLM cache: {LLMCache.select().count()} câu trả lời | hit {self.stats['hits']} / "
+                f"miss {self.stats['misses']} ({rate:.0f}%) | evict {self.stats['evictions']}")
+
+llm_cache = LLMResponseCache()
+
+async def groq_chat_async(prompt, key=None, model=CHAT_MODEL, use_cache=True):
+    if use_cache:
+        cached = await net.offload(llm_cache.get, model, prompt)
+        if cached is not None: return cached
+    client = groq_clients.async_client(key)
+    with groq_clients.timed("chat"):
+        completion = await net.request(client.chat.completions.create(
+            messages=[{"role":"user","content":prompt}], model=model))
+    res = completion.choices[0].message.content
+    if use_cache and res:
+        try: llm_cache.put(model, prompt, res)
+        except Exception as e: print(f"Lỗi lưu LLM cache: {e}")
+    return res
+
+def groq_chat(prompt, key=None, model=CHAT_MODEL, use_cache=True):
+    # Bản đồng bộ cho code chạy ở luồng thường (chờ kết quả từ net.loop)
+    return net.run(groq_chat_async(prompt, key, model, use_cache))
+
+# --- BACKEND CHẤM PHÁT ÂM: Settings "stt_backend" = groq (mặc định) | local ---
+_stt_backends = {}
+
+def get_stt_backend():
+    try: name = Settings.get(Settings.key == "stt_backend").value
+    except Settings.DoesNotExist: name = "groq"
+    if name not in _stt_backends:
+        if name == "groq":
+            _stt_backends[name] = make_backend("groq", client_factory=groq_clients.client, timer=groq_clients.timed)
+        else:
+            _stt_backends[name] = make_backend(name)
+    return _stt_backends[name]
+
+# --- HÀM LẤY DATA TỪ GROQ ---
+async def get_groq_audio_bytes(text, key):
+    try:
+        client = groq_clients.async_client(key)
+        with groq_clients.timed("speech"):
+            async def speak():
+                response = await client.audio.speech.create(
+                    model="playai-tts",
+                    voice=TTS_VOICE,
+                    input=text,
+                    response_format="mp3"
+                )
+                # Thay response.content bằng response.read()
+                return await response.read()
+            return await net.request(speak())
+    except Exception as e:
+        print(f"Lỗi Groq API: {e}")
+        return None
+
+# --- HÀM LẤY DATA TỪ GOOGLE ---
+def get_google_audio_bytes(text):
+    try:
+        from gtts import gTTS # Import ở đây hoặc đầu file
+        tts = gTTS(text=text, lang='en', tld='com')
+        
+        # Lưu vào RAM (BytesIO) để lấy bytes
+        fp = io.BytesIO()
+        tts.write_to_fp(fp)
+        fp.seek(0)
+        return fp.read()
+    except Exception as e:
+        print(f"Lỗi Google TTS: {e}")
+        return None
+
+async def synthesize_audio_async(text, key=None):
+    # Thử Groq trước, thất bại -> Google (gTTS đồng bộ -> chạy ở executor của net)
+    audio_bytes = await get_groq_audio_bytes(text, key) if key else None
+    if not audio_bytes:
+        print("⚠️ Chuyển sang Google TTS...")
+        try: audio_bytes = await net.blocking(get_google_audio_bytes, text)
+        except asyncio.TimeoutError:
+            print("Lỗi Google TTS: quá thời gian")
+            audio_bytes = None
+    return audio_bytes
+
+def synthesize_audio(text, key=None):
+    return net.run(synthesize_audio_async(text, key))
+
+PREFETCH_WORKERS = 3  # Số request TTS chạy song song khi làm nóng cache
+PREFETCH_AHEAD = 3    # Số thẻ sắp tới được tải trước
+PREFETCH_DUE_WINDOW = 20  # Số thẻ đến hạn đọc/đưa vào hàng đợi prefetch mỗi lượt
+
+class AudioPrefetcher:
+    """Làm nóng AudioCache bằng coroutine trên net.loop (không tốn luồng); gộp các request trùng text."""
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self.workers = workers
+        self._limit = None # asyncio.Semaphore, tạo trong loop
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._started = set() # text đã qua semaphore (đang gọi API thật)
+        self._due_future = None
+
+    async def _synthesize(self, text):
+        data = await synthesize_audio_async(text, get_groq_key())
+        if data:
+            try: await net.offload(audio_cache.put, text, data)
+            except Exception as e: print(f"Lỗi lưu Cache: {e}")
+        return data
+
+    async def _warm(self, text):
+        # Chỉ gọi API khi cache chưa có; prefetch không được chiếm hết slot mạng của UI
+        if self._limit is None: self._limit = asyncio.Semaphore(self.workers)
+        async with self._limit:
+            with self._lock: self._started.add(text)
+            if await net.offload(audio_cache.contains, text): return None
+            return await self._synthesize(text)
+
+    def _submit(self, text):
+        with self._lock:
+            future = self._inflight.get(text)
+            if future is None:
+                future = net.submit(self._warm(text))
+                self._inflight[text] = future
+                future.add_done_callback(lambda f, t=text: self._done(t, f))
+            return future
+
+    def _done(self, text, future):
+        with self._lock:
+            if self._inflight.get(text) is future:
+                del self._inflight[text]
+                self._started.discard(text)
+
+    async def fetch_async(self, text):
+        # Dùng cho phát ngay: nếu prefetch đúng text này đang gọi API thì chờ kết quả, không gọi lần 2.
+        # Còn xếp hàng sau semaphore prefetch thì bỏ nó đi và tải ngay, không chờ sau các thẻ khác.
+        with self._lock:
+            future = self._inflight.get(text)
+            started = text in self._started
+        if future and not future.cancelled():
+            if started:
+                try: data = await asyncio.wrap_future(future)
+                except (Exception, asyncio.CancelledError): data = None
+                if data: return data
+            else: future.cancel()
+        data = await net.offload(audio_cache.get, text)
+        return data if data is not None else await self._synthesize(text)
+
+    def fetch(self, text):
+        return net.run(self.fetch_async(text))
+
+    def prefetch(self, texts):
+        for text in texts:
+            if text and text.strip(): self._submit(text)
+
+    @staticmethod
+    def _due_window(model, field, after_id, size=PREFETCH_DUE_WINDOW):
+        # 1 cửa sổ theo id (keyset), chỉ lấy các text chưa có audio
+        cached = AudioCache.select(AudioCache.text)
+        return list(model.select(model.id, field)
+                    .where(model.next_review <= datetime.date.today(), field.not_in(cached), model.id > after_id)
+                    .order_by(model.id).limit(size).tuples())
+
+    async def _prefetch_due(self, model, field):
+        # Đọc DB ở executor, xong cửa sổ này mới đọc cửa sổ sau -> hàng đợi prefetch luôn nhỏ
+        last_id = 0
+        while True:
+            rows = await net.offload(self._due_window, model, field, last_id)
+            if not rows: return
+            last_id = rows[-1][0]
+            futures = [self._submit(text) for _, text in rows if text and text.strip()]
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+
+    def prefetch_due(self, model, field):
+        # Cả hàng đợi hôm nay, chạy nền trên net.loop (không truy vấn ở luồng Tk)
+        with self._lock:
+            if self._due_future: self._due_future.cancel()
+            self._due_future = net.submit(self._prefetch_due(model, field))
+
+    def cancel_pending(self):
+        # Đổi phiên ôn -> bỏ các job chưa chạy
+        with self._lock:
+            if self._due_future: self._due_future.cancel()
+            for future in list(self._inflight.values()): future.cancel() # Huỷ cả request đang chờ mạng
+
+prefetcher = AudioPrefetcher()
+
+# ==========================================
+# --- TẠO SẴN AUDIO CHO CẢ KHO (CHẠY ĐÊM, KHÔNG CẦN UI) ---
+# ==========================================
+class RateLimiter:
+    """Token bucket dùng chung giữa các luồng: tối đa `rate` lần/giây."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def _reserve(self):
+        if not self.interval: return 0
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0: time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0: await asyncio.sleep(wait)
+
+PRESYNTH_SOURCES = ((Sentence, Sentence.text), (Vocabulary, Vocabulary.word))
+
+def _missing_audio_rows(model, field, after, limit):
+    # Keyset theo (next_review, id): đi 1 lượt qua kho, thẻ gần hạn trước, không quay lại dòng đã xử lý
+    cached = AudioCache.select(AudioCache.text)
+    query = model.select(model.next_review, model.id, field).where(field.not_in(cached))
+    if after is not None:
+        due, last_id = after
+        query = query.where((model.next_review > due) | ((model.next_review == due) & (model.id > last_id)))
+    return list(query.order_by(model.next_review, model.id).limit(limit).tuples())
+
+def _estimate_missing_audio():
+    # (số text chưa có audio, ước lượng byte theo cỡ clip trung bình đang có trong cache)
+    cached = AudioCache.select(AudioCache.text)
+    missing = sum(model.select().where(field.not_in(cached)).count() for model, field in PRESYNTH_SOURCES)
+    avg = AudioCache.select(fn.AVG(AudioCache.size)).scalar() or 0
+    return missing, int(missing * avg)
+
+def presynthesize_deck(concurrency=4, retries=3, rate=2.0, batch_size=50):
+    """Tạo audio cho mọi câu/từ chưa có cache. Commit theo lô -> dừng giữa chừng chạy lại là tiếp tục.
+
+    Không dọn LRU trong lúc chạy (nếu không sẽ xoá chính clip vừa tạo rồi tạo lại mãi):
+    cache chạm ngân sách audio_cache_max_mb thì dừng và báo.
+    """
+    key = get_groq_key()
+    limiter = RateLimiter(rate)
+    budget = audio_cache.max_bytes
+
+    async def job(text):
+        for attempt in range(retries + 1):
+            await limiter.acquire_async()
+            data = await synthesize_audio_async(text, key)
+            if data: return text, data
+            if attempt < retries: await asyncio.sleep(2 ** attempt) # Backoff: 1, 2, 4... giây
+        return text, None
+
+    def check_budget():
+        # Trả về False khi chưa ước lượng được (cache trống, chưa biết cỡ clip)
+        missing, estimate = _estimate_missing_audio()
+        if not estimate: return False
+        if audio_cache.total_bytes() + estimate > budget:
+            print(f"⚠️ Còn {missing} clip (~{estimate / 1048576:.1f} MB), vượt ngân sách cache "
+                  f"{budget / 1048576:.1f} MB -> sẽ dừng khi đầy. Tăng audio_cache_max_mb để tạo đủ.")
+        return True
+
+    checked = check_budget()
+    done, failed, seen = 0, 0, set() # seen: text đã xử lý (thành công/lỗi) trong lượt này
+    started = time.monotonic()
+    for model, field in PRESYNTH_SOURCES:
+        after = None
+        while True:
+            if audio_cache.total_bytes() >= budget:
+                print(f"⚠️ Cache đã đạt ngân sách {budget / 1048576:.1f} MB -> dừng "
+                      f"(đã tạo {done} clip lượt này). Tăng audio_cache_max_mb rồi chạy lại để tạo tiếp.")
+                return done, failed
+            rows = _missing_audio_rows(model, field, after, batch_size)
+            if not rows: break
+            after = rows[-1][:2]
+            window = list(dict.fromkeys(t for _, _, t in rows if t and t.strip() and t not in seen))
+            seen.update(window)
+            if not window: continue
+            results = net.map(job, window, limit=concurrency)
+            ok = [(t, d) for t, d in results if d]
+            failed += len(results) - len(ok)
+            if ok: audio_cache.put_many(ok, evict=False)
+            done += len(ok)
+            if not checked: checked = check_budget()
+            print(f"🔊 {done} clip | lỗi {failed} | {done / (time.monotonic() - started):.1f} clip/s")
+    return done, failed
+
+# ==========================================
+# --- AUDIO PLAYER (1 LUỒNG CỐ ĐỊNH, PHÁT TỪ RAM) ---
+# ==========================================
+PLAYER_PCM_CACHE = 16 # Số clip đã giải mã (PCM) giữ lại để phát lại tức thì
+
+class AudioPlayer:
+    """Luồng phát duy nhất nhận lệnh qua queue; lệnh mới luôn cắt lệnh đang phát."""
+
+    def __init__(self, cache_size=PLAYER_PCM_CACHE):
+        self.cache_size = cache_size
+        self.commands = queue.Queue()
+        self._sounds = collections.OrderedDict() # text -> pygame.mixer.Sound (PCM đã giải mã)
+        self._lock = threading.Lock()
+        self._channel = None
+        self._thread = threading.Thread(target=self._run, name="audio-player", daemon=True)
+        self._thread.start()
+
+    def has(self, key):
+        with self._lock: return key in self._sounds
+
+    def play(self, key, data=None):
+        self.commands.put(("play", key, data))
+
+    def stop(self):
+        self.commands.put(("stop", None, None))
+
+    def warm(self):
+        # Nạp pygame + mở mixer ở nền (sau khi cửa sổ đã hiện), để lần phát đầu không phải chờ
+        self.commands.put(("warm", None, None))
+
+    def _run(self):
+        while True:
+            cmd, key, data = self.commands.get()
+            # Chỉ giữ lệnh mới nhất nếu người dùng bấm F1 liên tục
+            while not self.commands.empty():
+                cmd, key, data = self.commands.get_nowait()
+            try:
+                pygame = lazy_import("pygame")
+                if not pygame.mixer.get_init(): pygame.mixer.init()
+                if cmd == "warm": continue
+                if self._channel: self._channel.stop()
+                pygame.mixer.music.stop()
+                if cmd == "play": self._play(key, data)
+            except Exception as e:
+                print(f"Lỗi phát âm thanh: {e}")
+
+    def _decode(self, key, data):
+        with self._lock:
+            sound = self._sounds.get(key)
+            if sound is not None:
+                self._sounds.move_to_end(key)
+                return sound
+        if data is None: return None
+        src = data if isinstance(data, mmap.mmap) else io.BytesIO(data)
+        src.seek(0)
+        sound = lazy_import("pygame").mixer.Sound(file=src)
+        with self._lock:
+            self._sounds[key] = sound
+            while len(self._sounds) > self.cache_size:
+                self._sounds.popitem(last=False)
+        return sound
+
+    def _play(self, key, data):
+        pygame = lazy_import("pygame")
+        try:
+            sound = self._decode(key, data)
+        except pygame.error:
+            # SDL_mixer cũ không giải mã MP3 thành Sound -> stream bằng mixer.music, vẫn từ RAM
+            pygame.mixer.music.load(io.BytesIO(bytes(data)), "mp3")
+            pygame.mixer.music.play()
+            return
+        if sound is not None:
+            self._channel = sound.play()
+
+player = AudioPlayer()
+
+# ==========================================
+# --- GIẢI THÍCH CÂU THEO LÔ (ĐẦU PHIÊN ÔN / CHẠY ĐÊM) ---
+# ==========================================
+EXPLAIN_CHUNK_SIZE = 20   # Số câu gói trong 1 request
+EXPLAIN_CONCURRENCY = 2   # Số request chạy song song
+EXPLAIN_SESSION_LIMIT = 60 # Đầu phiên ôn chỉ giải thích sẵn bấy nhiêu thẻ đầu hàng đợi (3 request)
+_explain_lock = threading.Lock()
+
+def _explain_prompt(rows):
+    items = "\n".join(json.dumps({"id": row.id, "text": row.text}, ensure_ascii=False) for row in rows)
+    return f"""
+    Dịch và giải thích từng câu tiếng Anh sau cho người Việt (mỗi dòng là 1 JSON object):
+    {items}
+
+    Trả về DUY NHẤT một JSON array, mỗi phần tử có dạng:
+    {{"id": <id>, "nghia": "<Nghĩa tiếng Việt sát nhất>", "ngu_canh": "<Khi nào dùng, với ai, trang trọng hay không>"}}
+    """
+
+def _parse_explanations(res, ids):
+    # Model đôi khi bọc trong ```json ... ``` -> chỉ lấy đoạn từ [ tới ]
+    # Chỉ nhận id thuộc lô đã gửi: model bịa/nhầm id thì không được ghi đè câu khác
+    start, end = res.find("["), res.rfind("]")
+    if start < 0 or end < start: return {}
+    out = {}
+    for item in json.loads(res[start:end + 1]):
+        try:
+            sentence_id = int(item["id"])
+            if sentence_id not in ids: continue
+            out[sentence_id] = f"- Nghĩa: {item['nghia'].strip()}\n- Ngữ cảnh: {item['ngu_canh'].strip()}"
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue # Bỏ phần tử hỏng, câu đó sẽ được giải thích lẻ khi ôn
+    return out
+
+def _save_meanings(meanings):
+    saved = 0
+    for sentence_id, meaning in meanings.items():
+        saved += (Sentence.update(meaning=meaning)
+                  .where(Sentence.id == sentence_id, Sentence.meaning.is_null()).execute())
+    return saved
+
+def explain_sentences_batch(key=None, chunk_size=EXPLAIN_CHUNK_SIZE, concurrency=EXPLAIN_CONCURRENCY,
+                            due_only=True, limit=None, ids=None):
+    """Giải thích các câu chưa có meaning theo lô (ids: chỉ các câu này). Trả về số câu đã ghi.
+
+    Mỗi lô xong là ghi ngay (1 transaction/lô): tắt app hay 1 lô bị treo không làm mất các lô đã trả tiền.
+    """
+    key = key or get_groq_key()
+    if not key or not _explain_lock.acquire(blocking=False): return 0 # Không có key / đang chạy rồi
+    try:
+        query = Sentence.select(Sentence.id, Sentence.text).where(Sentence.meaning.is_null())
+        if due_only: query = query.where(Sentence.next_review <= datetime.date.today())
+        if ids is not None: query = query.where(Sentence.id.in_(list(ids)))
+        rows = list(query.order_by(Sentence.next_review).limit(limit))
+        chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+        async def job(chunk):
+            try:
+                meanings = _parse_explanations(await groq_chat_async(_explain_prompt(chunk), key),
+                                               {row.id for row in chunk})
+            except Exception as e:
+                print(f"Lỗi giải thích lô {len(chunk)} câu: {e}")
+                return 0
+            if not meanings: return 0
+            return await asyncio.wrap_future(db_writer.submit(_save_meanings, meanings))
+
+        saved = sum(net.map(job, chunks, limit=concurrency))
+        print(f"💡 Đã giải thích {saved}/{len(rows)} câu ({len(chunks)} request)")
+        return saved
+    finally:
+        _explain_lock.release()
+
+# ==========================================
+# --- NHẬP TỪ VỰNG THEO LÔ (GROQ: NGHĨA + HDSD) ---
+# ==========================================
+VOCAB_CHUNK_SIZE = 40     # Số từ mỗi prompt (không vượt context, lỗi thì chỉ mất 1 lô)
+VOCAB_CONCURRENCY = 3
+VOCAB_RATE = 2.0          # request/giây
+VOCAB_RETRIES = 2         # Số vòng thử lại các lô lỗi
+
+def _vocab_prompt(words):
+    return f"""
+            I have this list of English words:
+            {', '.join(words)}
+
+            For each word, provide the Vietnamese meaning and a very short usage guide (1 sentence).
+            Output strictly in this format:
+            Word || Meaning || Usage Guide
+
+            Example:
+            Serendipity || Sự tình cờ may mắn || Dùng khi tìm thấy điều tốt đẹp không chủ đích.
+            """
+
+def _parse_vocab(res):
+    rows = []
+    for line in res.split('\n'):
+        if "||" in line:
+            parts = line.split("||")
+            if len(parts) >= 3:
+                w = parts[0].strip()
+                m = parts[1].strip()
+                u = parts[2].strip()
+                if w: rows.append({'word': w, 'meaning': f"{m}\n💡 HDSD: {u}"})
+    return rows
+
+def import_vocab_ai(words, key=None, chunk_size=VOCAB_CHUNK_SIZE, concurrency=VOCAB_CONCURRENCY,
+                    rate=VOCAB_RATE, retries=VOCAB_RETRIES):
+    """Chia danh sách từ thành lô, gọi Groq song song (có rate limit), chỉ thử lại lô lỗi.
+    Trả về (số từ đã thêm, danh sách từ AI không trả về được)."""
+    key = key or get_groq_key()
+    words = list(dict.fromkeys(w.strip() for w in words if w.strip())) # Bỏ trùng, giữ thứ tự
+    pending = [words[i:i + chunk_size] for i in range(0, len(words), chunk_size)]
+    limiter = RateLimiter(rate)
+    rows, missing = [], []
+
+    async def job(chunk):
+        await limiter.acquire_async()
+        try: return chunk, _parse_vocab(await groq_chat_async(_vocab_prompt(chunk), key))
+        except Exception as e:
+            print(f"Lỗi lô {len(chunk)} từ: {e}")
+            return chunk, None
+
+    for attempt in range(retries + 1):
+        failed = []
+        for chunk, parsed in net.map(job, pending, limit=concurrency):
+            if not parsed:
+                failed.append(chunk)
+                continue
+            rows += parsed
+            got = {r['word'].lower() for r in parsed}
+            missing += [w for w in chunk if w.lower() not in got]
+        if not failed: break
+        pending = failed
+        if attempt < retries: time.sleep(2 ** attempt) # Chỉ chờ khi còn lượt thử tiếp
+    else:
+        missing += [w for chunk in failed for w in chunk]
+
+    inserted = insert_many_ignore(Vocabulary, rows)
+    return inserted, missing
+
+# ==========================================
+# --- NHẬP CÂU HÀNG LOẠT (UI & CLI: .txt / .csv / .jsonl) ---
+# ==========================================
+SENTENCE_IMPORT_CHUNK = 5000 # Số câu mỗi transaction (giữa các chunk UI vẫn đọc DB được)
+
+ImportStats = collections.namedtuple("ImportStats", "inserted skipped seconds")
+
+def normalize_sentence(text):
+    return " ".join(text.replace("’", "'").split())
+
+def read_sentence_file(path):
+    """Đọc file câu: .txt (mỗi dòng 1 câu), .csv (cột text[, meaning] hoặc cột đầu), .jsonl ({"text", "meaning"} hoặc chuỗi)."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            rows = list(csv.reader(f))
+            if rows and rows[0] and rows[0][0].strip().lower() == "text":
+                header = [h.strip().lower() for h in rows.pop(0)]
+                return [dict(zip(header, r)) for r in rows if r]
+            return [{"text": r[0], "meaning": r[1] if len(r) > 1 else None} for r in rows if r]
+        if ext == ".jsonl":
+            items = []
+            for line in f:
+                if not line.strip(): continue
+                obj = json.loads(line)
+                items.append(obj if isinstance(obj, dict) else {"text": str(obj)})
+            return items
+        return f.read().split("\n")
+
+def import_sentences(items, chunk_size=SENTENCE_IMPORT_CHUNK):
+    """Nhập nhiều câu: chuẩn hoá + bỏ trùng trong RAM, rồi INSERT ... ON CONFLICT IGNORE theo lô.
+
+    items: chuỗi hoặc dict {"text", "meaning"}. Trả về ImportStats (câu mới, câu bỏ qua, số giây).
+    """
+    started = time.perf_counter()
+    rows, seen, total = [], set(), 0
+    for item in items:
+        text, meaning = (item.get("text") or "", item.get("meaning")) if isinstance(item, dict) else (item, None)
+        text = normalize_sentence(text)
+        if not text: continue
+        total += 1
+        if text in seen: continue
+        seen.add(text)
+        rows.append({"text": text, "meaning": (meaning or "").strip() or None})
+    inserted = 0
+    for i in range(0, len(rows), chunk_size):
+        inserted += insert_many_ignore(Sentence, rows[i:i + chunk_size])
+    return ImportStats(inserted, total - inserted, time.perf_counter() - started)
+
+# ==========================================
+# --- DỊCH GOOGLE: CACHE TRÊN ĐĨA + DỊCH SONG SONG ---
+# ==========================================
+TRANSLATE_WORKERS = 4
+
+class TranslationService:
+    """Mọi lời gọi GoogleTranslator đi qua đây: cache trong DB, mỗi luồng giữ 1 translator cho mỗi cặp ngôn ngữ."""
+
+    def __init__(self, workers=TRANSLATE_WORKERS):
+        self.workers = workers
+        self._local = threading.local()
+
+    @staticmethod
+    def make_key(text, source, target):
+        return hashlib.sha256(f"{source}>{target}\0{text}".encode("utf-8")).hexdigest()
+
+    def _translator(self, source, target):
+        cache = self._local.__dict__.setdefault("translators", {})
+        if (source, target) not in cache:
+            cache[(source, target)] = lazy_import("deep_translator").GoogleTranslator(source=source, target=target)
+        return cache[(source, target)]
+
+    def _lookup(self, keys):
+        found = {}
+        for i in range(0, len(keys), BULK_INSERT_BATCH):
+            query = (TranslationCache.select(TranslationCache.key, TranslationCache.result)
+                     .where(TranslationCache.key.in_(keys[i:i + BULK_INSERT_BATCH])).tuples())
+            found.update(query)
+        return found
+
+    async def _call(self, text, source, target):
+        # deep_translator chỉ có API đồng bộ -> chạy ở executor của net.loop
+        try: return await net.blocking(lambda: self._translator(source, target).translate(text))
+        except Exception as e:
+            print(f"Lỗi Google Translate: {e or type(e).__name__}")
+            return None
+
+    def translate_batch(self, texts, source='auto', target='vi'):
+        """Dịch nhiều câu/từ: lấy cache trong 1 lượt truy vấn, phần còn lại dịch song song."""
+        keys = [self.make_key(t, source, target) for t in texts]
+        found = self._lookup(list(set(keys)))
+        todo = {k: t for k, t in zip(keys, texts) if k not in found}
+        fresh = dict(zip(todo, net.map(lambda t: self._call(t, source, target), todo.values(), limit=self.workers)))
+        rows = [{"key": k, "result": r} for k, r in fresh.items() if r]
+        if rows: insert_many_ignore(TranslationCache, rows)
+        found.update(fresh)
+        return [found.get(k) for k in keys]
+
+    def translate(self, text, source='auto', target='vi'):
+        return self.translate_batch([text], source, target)[0]
+
+translator = TranslationService()
+
+# ==========================================
+# --- BỘ ĐIỀU PHỐI TÁC VỤ NỀN (POOL THEO TÀI NGUYÊN + BƠM KẾT QUẢ VỀ TK) ---
+# ==========================================
+# "network" = luồng điều phối cho hàm đồng bộ (bản thân request vẫn chạy trên net.loop)
+TASK_POOLS = {"network": 4, "audio": 1, "db": 1} # audio = mic (chỉ 1 luồng được mở stream)
+TASK_PUMP_MS = 30
+
+class TaskScheduler:
+    """Mọi việc nền của UI đi qua đây thay vì tự tạo threading.Thread.
+
+    - Mỗi loại tài nguyên có pool giới hạn riêng; pool "net" chạy coroutine trên net.loop.
+    - `key`: việc trùng khoá đang chạy thì dùng lại Future cũ (bấm F1 liên tục chỉ tải 1 lần).
+    - `scope`: advance(scope) huỷ mọi việc cũ của scope đó: chưa chạy thì bỏ, coroutine đang
+      chờ mạng thì bị cancel, đã xong thì không giao kết quả (vd. người học đã sang thẻ khác).
+    - Kết quả/callback về UI qua 1 hàng đợi, được bơm bằng 1 vòng `after` duy nhất.
+    """
+
+    def __init__(self, pools=TASK_POOLS):
+        self.pools = {name: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"task-{name}")
+                      for name, n in pools.items()}
+        self._ui = queue.SimpleQueue()
+        self._inflight = {}
+        self._generations = collections.defaultdict(int)
+        self._scoped = collections.defaultdict(set)
+        self._pending = set() # Future của các pool luồng, để huỷ khi tắt app
+        self._lock = threading.Lock()
+        self.root = None
+
+    def attach(self, root, interval_ms=TASK_PUMP_MS):
+        self.root = root
+        self._interval = interval_ms
+        root.after(interval_ms, self._pump)
+
+    def _pump(self):
+        while True:
+            try: fn, args, kwargs = self._ui.get_nowait()
+            except queue.Empty: break
+            try: fn(*args, **kwargs)
+            except Exception as e: print(f"Lỗi callback UI: {e}")
+        if self.root is not None:
+            self.root.after(self._interval, self._pump)
+
+    def call_soon(self, fn, *args, **kwargs):
+        """Chạy fn trên luồng UI ở lần bơm kế tiếp (gọi được từ mọi luồng)."""
+        self._ui.put((fn, args, kwargs))
+
+    def advance(self, scope):
+        with self._lock:
+            self._generations[scope] += 1
+            stale, self._scoped[scope] = self._scoped[scope], set()
+        for future in stale: future.cancel()
+
+    def is_current(self, scope, generation):
+        return scope is None or self._generations[scope] == generation
+
+    def submit(self, pool, fn, *args, key=None, scope=None, on_done=None, on_error=None):
+        with self._lock:
+            if key is not None and key in self._inflight:
+                return self._inflight[key]
+            generation = self._generations[scope] if scope else None
+
+            if pool == "net":
+                future = net.submit(fn(*args))
+            else:
+                def run():
+                    if not self.is_current(scope, generation): return None # Cũ rồi, khỏi chạy
+                    return fn(*args)
+                future = self.pools[pool].submit(run)
+                self._pending.add(future)
+            if key is not None: self._inflight[key] = future
+            if scope: self._scoped[scope].add(future)
+        future.add_done_callback(lambda f: self._finish(f, fn, key, scope, generation, on_done, on_error))
+        return future
+
+    def _finish(self, future, fn, key, scope, generation, on_done, on_error):
+        with self._lock:
+            if key is not None and self._inflight.get(key) is future: del self._inflight[key]
+            if scope: self._scoped[scope].discard(future)
+            self._pending.discard(future)
+        if future.cancelled() or not self.is_current(scope, generation): return
+        error = future.exception()
+        if isinstance(error, concurrent.futures.CancelledError): return # Request mạng bị huỷ (tắt app)
+        if error is not None:
+            print(f"Lỗi tác vụ {getattr(fn, '__name__', fn)}: {error}")
+            if on_error: self.call_soon(on_error, error)
+        elif on_done:
+            self.call_soon(on_done, future.result())
+
+    def shutdown(self):
+        # Gọi được nhiều lần (đóng cửa sổ rồi atexit)
+        self.root = None
+        # shutdown(cancel_futures=True) cần Python 3.9+ -> tự huỷ các việc chưa chạy (giữ 3.8)
+        with self._lock: pending, self._pending = self._pending, set()
+        for future in pending: future.cancel()
+        for pool in self.pools.values(): pool.shutdown(wait=False)
+        net.stop()
+
+tasks = TaskScheduler()
+atexit.register(tasks.shutdown) # atexit chạy ngược: dừng tác vụ trước, rồi mới dừng db_writer
+
+startup_profile.mark("dịch vụ nền: cache, net loop, player, scheduler")
 
 # ==========================================
 # 2. GIAO DIỆN CHÍNH
@@ -65,18 +1630,20 @@ class EnglishApp(ctk.CTk):
         self.title("Super English Pro: Smart Loop (+Groq Voice)")
         self.geometry("1100x850")
 
-        try:
-            pygame.mixer.init()
-        except: pass
-
         self.mode = "sentence"
-        self.review_queue = []
+        self.review_queue = ReviewQueue(Sentence, [])
         self.current_item = None
         self.temp_suggested_sentence = "" 
         
         # --- BIẾN CHO VOICE RECORDER (MỚI) ---
         self.is_recording = False
-        self.audio_frames = []
+        self.audio_pcm = memoryview(b"")
+        self.card_shown_at = time.monotonic()
+        self.voice_logprob = None # logprob của lần đọc gần nhất cho thẻ hiện tại
+        tasks.attach(self)
+        # Dừng việc nền khi đóng cửa sổ, trước khi mainloop trả về: Python 3.9+ chờ các luồng pool
+        # chạy xong rồi mới tới atexit, nên để atexit lo thì đóng app phải chờ hết request mạng
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # --- SIDEBAR ---
         self.grid_columnconfigure(1, weight=1)
@@ -109,14 +1676,16 @@ class EnglishApp(ctk.CTk):
         self.main = ctk.CTkFrame(self, corner_radius=0, fg_color="transparent")
         self.main.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
 
-        # Init Frames
-        self.frame_add = self.ui_add_unified()
-        self.frame_sent = self.ui_sent_review()
-        self.frame_vocab = self.ui_vocab_review()
-        self.frame_settings = self.ui_settings()
+        # Frame chỉ được dựng ở lần đầu mở (xem self.frame)
+        self._frame_builders = {"add": self.ui_add_unified, "sent": self.ui_sent_review,
+                                "vocab": self.ui_vocab_review, "settings": self.ui_settings}
+        self._frames = {}
+        startup_profile.mark("cửa sổ + sidebar")
 
-        self.frames = [self.frame_add, self.frame_sent, self.frame_vocab, self.frame_settings]
+        self._schedule_reconcile()
         self.nav_sentence()
+        startup_profile.mark("màn ôn câu + phiên ôn đầu tiên")
+        self.after_idle(player.warm)
 
     # ==========================================
     # 3. UTILS & HELPERS
@@ -125,14 +1694,19 @@ class EnglishApp(ctk.CTk):
         for btn in [self.btn_nav_sent, self.btn_nav_vocab, self.btn_nav_add, self.btn_nav_settings]:
             btn.configure(fg_color="transparent")
 
+    def frame(self, name):
+        if name not in self._frames:
+            self._frames[name] = self._frame_builders[name]()
+        return self._frames[name]
+
     def hide_all_frames(self):
-        for f in self.frames: f.pack_forget()
+        for f in self._frames.values(): f.pack_forget()
 
     def nav_sentence(self):
         self.reset_buttons()
         self.hide_all_frames()
         self.btn_nav_sent.configure(fg_color="#1565C0")
-        self.frame_sent.pack(fill="both", expand=True)
+        self.frame("sent").pack(fill="both", expand=True)
         self.mode = "sentence"
         self.update_stats()
         self.start_sent_session()
@@ -141,7 +1715,7 @@ class EnglishApp(ctk.CTk):
         self.reset_buttons()
         self.hide_all_frames()
         self.btn_nav_vocab.configure(fg_color="#D84315")
-        self.frame_vocab.pack(fill="both", expand=True)
+        self.frame("vocab").pack(fill="both", expand=True)
         self.mode = "vocab"
         self.update_stats()
         self.start_vocab_session()
@@ -150,140 +1724,74 @@ class EnglishApp(ctk.CTk):
         self.reset_buttons()
         self.hide_all_frames()
         self.btn_nav_add.configure(fg_color="#2E7D32")
-        self.frame_add.pack(fill="both", expand=True)
+        self.frame("add").pack(fill="both", expand=True)
         self.update_stats()
 
     def nav_settings(self):
         self.reset_buttons()
         self.hide_all_frames()
         self.btn_nav_settings.configure(fg_color="#546E7A")
-        self.frame_settings.pack(fill="both", expand=True)
+        self.frame("settings").pack(fill="both", expand=True)
+        self.lbl_groq_metrics.configure(text=groq_clients.report())
+        self.lbl_cache_stats.configure(text=audio_cache.report() + "\n" + llm_cache.report())
 
     # ==========================================
     # 4. LOGIC & HELPER
     # ==========================================
     def get_key(self):
-        try: return Settings.get(Settings.key == "groq").value
-        except: return None
+        return get_groq_key()
+
+    def on_close(self):
+        tasks.shutdown()
+        self.destroy()
 
     def update_stats(self):
-        try:
-            sent_total = Sentence.select().count()
-            vocab_total = Vocabulary.select().count()
-            if self.mode == "sentence":
-                due = Sentence.select().where(Sentence.next_review <= datetime.date.today()).count()
-                self.lbl_stats.configure(text=f"[CÂU]\nTổng: {sent_total} | Cần ôn: {due}")
-            else:
-                due = Vocabulary.select().where(Vocabulary.next_review <= datetime.date.today()).count()
-                self.lbl_stats.configure(text=f"[TỪ]\nTổng: {vocab_total} | Cần ôn: {due}")
-        except: pass
+        # Đọc số đếm trong RAM (không truy vấn DB trên luồng UI)
+        model, label = (Sentence, "CÂU") if self.mode == "sentence" else (Vocabulary, "TỪ")
+        snap = deck_stats.snapshot(model)
+        if snap is None:
+            self.lbl_stats.configure(text=f"[{label}]\nĐang đếm...")
+            self.reconcile_stats()
+            return
+        total, due = snap
+        self.lbl_stats.configure(text=f"[{label}]\nTổng: {total} | Cần ôn: {due}")
+
+    def reconcile_stats(self):
+        tasks.submit("db", deck_stats.reconcile, key=("stats",),
+                     on_done=lambda _: self.update_stats(),
+                     on_error=lambda e: self.lbl_stats.configure(text="Lỗi đọc thống kê"))
+
+    def _schedule_reconcile(self):
+        self.reconcile_stats()
+        self.after(STATS_RECONCILE_MS, self._schedule_reconcile)
 
     # ==========================================
     # --- PHẦN TTS CACHING (LƯU DB ĐỂ TIẾT KIỆM) ---
     # ==========================================
     def play_audio(self, text):
         if not text or not text.strip(): return
-        # Chạy luồng riêng
-        threading.Thread(target=self._tts_caching_manager, args=(text,)).start()
+        # Clip vừa phát còn PCM trong player -> phát lại ngay, không đụng DB
+        if player.has(text):
+            player.play(text)
+            return
+        # Bấm liên tục cùng 1 câu -> dùng chung 1 lần tải; sang thẻ khác -> không phát nữa
+        tasks.submit("net", self._tts_caching_manager, text, key=("tts", text), scope="card",
+                     on_done=lambda audio_bytes: self._play_fetched(text, audio_bytes))
 
-    def _tts_caching_manager(self, text):
-        # BƯỚC 1: KIỂM TRA TRONG DATABASE (CACHE)
+    async def _tts_caching_manager(self, text):
+        # Cache -> (prefetch đang chạy) -> Groq -> Google, kết quả được lưu lại DB
         try:
-            cached_audio = AudioCache.get_or_none(AudioCache.text == text)
-            if cached_audio:
-                # print("✅ Đã có trong Cache -> Lấy ra dùng ngay!")
-                self._play_from_bytes(cached_audio.data)
-                return
+            return await prefetcher.fetch_async(text)
         except Exception as e:
-            print(f"Lỗi đọc Cache: {e}")
-
-        # BƯỚC 2: NẾU CHƯA CÓ -> GỌI API (TỐN TIỀN/LIMIT)
-        audio_bytes = None
-        
-        # 2a. Thử Groq
-        key = self.get_key()
-        if key:
-            audio_bytes = self._get_groq_audio_bytes(text, key)
-        
-        # 2b. Nếu Groq thất bại -> Thử Google
-        if not audio_bytes:
-            print("⚠️ Chuyển sang Google TTS...")
-            audio_bytes = self._get_google_audio_bytes(text)
+            print(f"Lỗi lấy âm thanh: {e}")
+            return None
 
-        # BƯỚC 3: LƯU VÀO DB VÀ PHÁT
+    def _play_fetched(self, text, audio_bytes):
         if audio_bytes:
-            # Lưu vào DB để lần sau không phải gọi nữa
-            try:
-                AudioCache.create(text=text, data=audio_bytes)
-                # print("💾 Đã lưu âm thanh vào DB")
-            except: pass # Có thể lỗi trùng lặp do đa luồng, kệ nó
-
-            # Phát âm thanh
-            self._play_from_bytes(audio_bytes)
+            player.play(text, audio_bytes)
         else:
             print("❌ Thất bại toàn tập: Không tạo được âm thanh.")
 
-    # --- HÀM LẤY DATA TỪ GROQ ---
-    def _get_groq_audio_bytes(self, text, key):
-        try:
-            client = Groq(api_key=key)
-            response = client.audio.speech.create(
-                model="playai-tts",
-                voice="Gail-PlayAI",
-                input=text,
-                response_format="mp3" 
-            )
-            # SỬA LỖI TẠI ĐÂY:
-            # Thay response.content bằng response.read()
-            return response.read() 
-        except Exception as e:
-            print(f"Lỗi Groq API: {e}")
-            return None
-
-    # --- HÀM LẤY DATA TỪ GOOGLE ---
-    def _get_google_audio_bytes(self, text):
-        try:
-            from gtts import gTTS # Import ở đây hoặc đầu file
-            tts = gTTS(text=text, lang='en', tld='com')
-            
-            # Lưu vào RAM (BytesIO) để lấy bytes
-            fp = io.BytesIO()
-            tts.write_to_fp(fp)
-            fp.seek(0)
-            return fp.read()
-        except Exception as e:
-            print(f"Lỗi Google TTS: {e}")
-            return None
-
-    # --- HÀM PHÁT TỪ BYTES (BINARY) ---
-    def _play_from_bytes(self, data_bytes):
-        try:
-            # Đổi đuôi file thành .mp3 để Pygame nhận diện đúng định dạng
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") 
-            temp_file.write(data_bytes)
-            temp_file.close() 
-
-            # Reset Mixer
-            if pygame.mixer.music.get_busy():
-                pygame.mixer.music.stop()
-            try: pygame.mixer.music.unload()
-            except: pass
-
-            pygame.mixer.music.load(temp_file.name)
-            pygame.mixer.music.play()
-
-            while pygame.mixer.music.get_busy():
-                pygame.time.Clock().tick(10)
-
-        except Exception as e:
-            print(f"Lỗi phát âm thanh: {e}")
-        finally:
-            try:
-                if 'temp_file' in locals() and os.path.exists(temp_file.name):
-                    pygame.time.Clock().tick(10)
-                    os.remove(temp_file.name)
-            except: pass
-
     # --- [PHẦN SỬA ĐỔI DUY NHẤT]: LOGIC GHI ÂM & CHẤM ĐIỂM BẰNG GROQ WHISPER ---
     def toggle_recording(self, event=None):
         if not self.is_recording:
@@ -292,109 +1800,90 @@ class EnglishApp(ctk.CTk):
             self.btn_mic.configure(text="⏹️ DỪNG & CHẤM ĐIỂM", fg_color="#d32f2f")
             self.lbl_voice_status.configure(text="🔴 Đang nghe... (Đọc to câu trên)", text_color="#FF5252")
             self.entry_sent_ans.delete(0, "end")
-            threading.Thread(target=self._record_thread).start()
+            tasks.submit("audio", self._record_thread)
         else:
             # Dừng ghi
             self.is_recording = False
             self.btn_mic.configure(text="⏳ Đang xử lý...", state="disabled")
 
     def _record_thread(self):
+        pyaudio = lazy_import("pyaudio") # Cần pip install pyaudio
         p = pyaudio.PyAudio()
         stream = p.open(format=pyaudio.paInt16, channels=AUDIO_CHANNELS,
                         rate=AUDIO_RATE, input=True, frames_per_buffer=AUDIO_CHUNK)
-        self.audio_frames = []
+        recorder = VoiceActivityRecorder(AUDIO_RATE, AUDIO_CHUNK)
         
         while self.is_recording:
-            data = stream.read(AUDIO_CHUNK)
-            self.audio_frames.append(data)
+            data = stream.read(AUDIO_CHUNK, exception_on_overflow=False)
+            if not recorder.feed(data): break # Đã nói xong (im lặng đủ lâu) -> tự dừng
 
         stream.stop_stream()
         stream.close()
         p.terminate()
 
-        # Sau khi dừng, lưu file và gửi API
-        self.save_and_analyze_audio()
+        if self.is_recording:
+            self.is_recording = False
+            tasks.call_soon(lambda: self.btn_mic.configure(text="⏳ Đang xử lý...", state="disabled"))
+
+        if not recorder.has_speech:
+            # Không có tiếng nói -> khỏi gửi API
+            tasks.call_soon(lambda: self.lbl_voice_status.configure(text="❌ Không nghe thấy gì (Hoặc ồn)", text_color="red"))
+            tasks.call_soon(self._reset_mic_ui)
+            return
+
+        # Sau khi dừng, lưu file và gửi API (pool mạng, giải phóng mic ngay)
+        self.audio_pcm = recorder.pcm()
+        tasks.submit("network", self.save_and_analyze_audio)
 
     def save_and_analyze_audio(self):
         try:
-            # 1. Tạo file tạm
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-            # QUAN TRỌNG: Phải đóng handle file tạm ngay lập tức trên Windows
-            # để tránh lỗi "File being used by another process"
-            temp_file.close() 
-            
-            # 2. Mở file bằng đường dẫn (path) để ghi dữ liệu âm thanh
-            wf = wave.open(temp_file.name, 'wb')
-            wf.setnchannels(AUDIO_CHANNELS)
-            wf.setsampwidth(2) # 16 bit
-            wf.setframerate(AUDIO_RATE)
-            wf.writeframes(b''.join(self.audio_frames))
-            wf.close()
+            # 1. Đóng gói audio ngay trong RAM (không file tạm)
+            upload = encode_audio(self.audio_pcm, AUDIO_RATE, AUDIO_CHANNELS, UPLOAD_FORMAT)
             
-            # 3. Gửi đi phân tích
-            self.after(0, lambda: self.lbl_voice_status.configure(text="📡 Đang gửi lên Groq...", text_color="#2196F3"))
-            self._call_groq_whisper(temp_file.name)
+            # 2. Gửi đi phân tích
+            tasks.call_soon(lambda: self.lbl_voice_status.configure(text="📡 Đang gửi lên Groq...", text_color="#2196F3"))
+            self._transcribe_and_score(upload)
             
         except Exception as e:
             print(f"Lỗi save audio: {e}")
-            self.after(0, self._reset_mic_ui)
+            tasks.call_soon(self._reset_mic_ui)
 
-    def _call_groq_whisper(self, file_path):
-        key = self.get_key()
-        if not key:
-            self.after(0, lambda: [messagebox.showerror("Lỗi", "Chưa nhập API Key!"), self._reset_mic_ui()])
+    def _transcribe_and_score(self, upload):
+        backend = get_stt_backend()
+        if backend.name == "groq" and not self.get_key():
+            tasks.call_soon(lambda: [messagebox.showerror("Lỗi", "Chưa nhập API Key!"), self._reset_mic_ui()])
             return
 
         try:
-            client = Groq(api_key=key)
-            # target = self.current_item.text if self.current_item else ""  <-- BỎ DÒNG NÀY (Không lấy đáp án làm gợi ý nữa)
-            
-            with open(file_path, "rb") as file:
-                transcription = client.audio.transcriptions.create(
-                    file=file,
-                    model="whisper-large-v3-turbo",
-                    language="en",
-                    # prompt=target, <-- BỎ DÒNG NÀY (Không nhắc bài cho AI)
-                    response_format="verbose_json",
-                    temperature=0.0
-                )
+            # KHÔNG gửi đáp án làm prompt (Không nhắc bài cho AI)
+            transcription = net.run(net.blocking(backend.transcribe, upload))
             
             # Xử lý kết quả
-            user_text = transcription.text.strip()
+            user_text = transcription.text
             
             # --- KIỂM TRA IM LẶNG (NO SPEECH PROB) ---
-            avg_logprob = 0
-            no_speech_prob = 0
-            if hasattr(transcription, 'segments') and transcription.segments:
-                # Lấy chỉ số no_speech_prob của segment đầu tiên
-                no_speech_prob = transcription.segments[0].get('no_speech_prob', 0)
-                
-                probs = [seg['avg_logprob'] for seg in transcription.segments]
-                avg_logprob = sum(probs) / len(probs) if probs else 0
+            avg_logprob = transcription.avg_logprob
+            no_speech_prob = transcription.no_speech_prob
 
             # Nếu xác suất "không có tiếng nói" quá cao (> 0.5) hoặc text rỗng
             if no_speech_prob > 0.5 or not user_text:
-                self.after(0, lambda: self.lbl_voice_status.configure(text="❌ Không nghe thấy gì (Hoặc ồn)", text_color="red"))
-                self.after(0, self._reset_mic_ui)
+                tasks.call_soon(lambda: self.lbl_voice_status.configure(text="❌ Không nghe thấy gì (Hoặc ồn)", text_color="red"))
+                tasks.call_soon(self._reset_mic_ui)
                 return
 
             # Tính điểm khớp (Similarity)
             # target vẫn dùng để so sánh kết quả, nhưng KHÔNG gửi cho AI biết trước
             target = self.current_item.text if self.current_item else ""
-            matcher = difflib.SequenceMatcher(None, target.lower().strip(), user_text.lower().strip())
-            similarity = matcher.ratio() * 100
+            similarity = score_answer(target, user_text).score * 100
 
             # Cập nhật UI
-            self.after(0, lambda: self._show_voice_result(user_text, similarity, avg_logprob))
+            tasks.call_soon(lambda: self._show_voice_result(user_text, similarity, avg_logprob))
 
         except Exception as e:
-            self.after(0, lambda: self.lbl_voice_status.configure(text=f"Lỗi: {str(e)}", text_color="red"))
+            msg = f"Lỗi: {e}" # e bị xoá khi ra khỏi except -> chụp lại trước
+            tasks.call_soon(lambda: self.lbl_voice_status.configure(text=msg, text_color="red"))
         finally:
-            # Sửa lỗi WinError 32: Đảm bảo file đóng trước khi xóa
-            try:
-                if os.path.exists(file_path): os.remove(file_path)
-            except: pass
-            self.after(0, self._reset_mic_ui)
+            tasks.call_soon(self._reset_mic_ui)
 
     def _show_voice_result(self, text, score, logprob):
         # Điền text vào ô
@@ -408,11 +1897,12 @@ class EnglishApp(ctk.CTk):
         if logprob < -0.8: conf_text, conf_color = "Khó nghe/Ồn", "#FF5252"
 
         # Hiển thị feedback
+        self.voice_logprob = logprob
         result_msg = f"Độ khớp: {score:.1f}% | Giọng: {conf_text} ({logprob:.2f})"
         self.lbl_voice_status.configure(text=result_msg, text_color=conf_color)
         
         # Tự động check luôn nếu điểm cao
-        if score > 90:
+        if score >= PASS_THRESHOLD * 100:
             self.check_sent()
 
     def _reset_mic_ui(self):
@@ -462,24 +1952,29 @@ class EnglishApp(ctk.CTk):
     def do_translate(self, event=None):
         text = self.entry_vi.get()
         if text:
-            try:
-                t = GoogleTranslator(source='auto', target='en').translate(text)
-                self.txt_sent_input.insert("end", t + "\n")
-                self.entry_vi.delete(0, "end")
-            except: pass
+            self.entry_vi.delete(0, "end")
+            def run():
+                t = translator.translate(text, 'auto', 'en')
+                if t: tasks.call_soon(lambda: self.txt_sent_input.insert("end", t + "\n"))
+                else: tasks.call_soon(lambda: self.entry_vi.insert(0, text)) # Lỗi -> trả lại chữ cho người dùng
+            tasks.submit("network", run)
 
     def save_sent(self):
         lines = self.txt_sent_input.get("1.0", "end").split('\n')
-        c = 0
-        for l in lines:
-            if l.strip():
-                try: 
-                    Sentence.get_or_create(text=l.strip())
-                    c+=1
-                except: pass
         self.txt_sent_input.delete("1.0", "end")
-        self.update_stats()
-        messagebox.showinfo("OK", f"Đã thêm {c} câu.")
+        tasks.submit("db", self._run_save_sent, lines)
+
+    def _run_save_sent(self, lines):
+        try:
+            stats = import_sentences(lines)
+            msg = f"Đã thêm {stats.inserted} câu."
+            if stats.skipped: msg += f" Bỏ qua {stats.skipped} câu trùng."
+            tasks.call_soon(lambda: [self.update_stats(), messagebox.showinfo("OK", msg)])
+        except Exception as e:
+            print(f"Lỗi nhập câu: {e}")
+            msg = f"Không lưu được câu: {e}" # e bị xoá khi ra khỏi except -> chụp lại trước
+            tasks.call_soon(lambda: [self.txt_sent_input.insert("1.0", "\n".join(lines)),
+                                   messagebox.showerror("Lỗi", msg)])
 
     def generate_vocab(self, event=None):
         topic = self.entry_topic.get().strip()
@@ -489,17 +1984,17 @@ class EnglishApp(ctk.CTk):
             return
         self.txt_vocab_input.delete("1.0", "end")
         self.txt_vocab_input.insert("1.0", "⏳ Đang tạo từ...")
-        threading.Thread(target=self._run_gen, args=(topic, key)).start()
+        tasks.submit("net", self._run_gen, topic, key, key=("gen_vocab",))
 
-    def _run_gen(self, topic, key):
+    async def _run_gen(self, topic, key):
         try:
-            client = Groq(api_key=key)
             prompt = f"List 10 English words about '{topic}'. Only words, one per line. No numbering."
             # [ĐÃ KHÔI PHỤC MODEL CỦA BẠN]
-            res = client.chat.completions.create(messages=[{"role":"user","content":prompt}], model="openai/gpt-oss-120b").choices[0].message.content
-            self.after(0, lambda: [self.txt_vocab_input.delete("1.0", "end"), self.txt_vocab_input.insert("1.0", res.strip())])
+            res = await groq_chat_async(prompt, key)
+            tasks.call_soon(lambda: [self.txt_vocab_input.delete("1.0", "end"), self.txt_vocab_input.insert("1.0", res.strip())])
         except Exception as e:
-            self.after(0, lambda: [self.txt_vocab_input.delete("1.0", "end"), self.txt_vocab_input.insert("1.0", f"Lỗi: {e}")])
+            msg = f"Lỗi: {e}" # e bị xoá khi ra khỏi except -> chụp lại trước
+            tasks.call_soon(lambda: [self.txt_vocab_input.delete("1.0", "end"), self.txt_vocab_input.insert("1.0", msg)])
 
     # --- LOGIC LƯU TỪ VỰNG + LẤY NGHĨA AI (MỚI) ---
     def save_vocab_ai(self):
@@ -514,74 +2009,51 @@ class EnglishApp(ctk.CTk):
             return
 
         self.btn_save_vocab.configure(state="disabled", text="⏳ Đang phân tích nghĩa & HDSD...")
-        threading.Thread(target=self._run_save_vocab_ai, args=(content, key)).start()
+        tasks.submit("network", self._run_save_vocab_ai, content, key, key=("save_vocab",))
 
     def _run_save_vocab_ai(self, text_block, key):
         # Tách từ để xử lý
         words = [w.strip() for w in text_block.split('\n') if w.strip()]
         if not words: 
-            self.after(0, lambda: self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)"))
+            tasks.call_soon(lambda: self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)"))
             return
 
-        # Gửi 1 cục sang Groq để tiết kiệm thời gian (Batch Processing)
+        # Chia lô, gọi Groq song song, lưu hàng loạt
         try:
-            client = Groq(api_key=key)
-            prompt = f"""
-            I have this list of English words:
-            {', '.join(words)}
-
-            For each word, provide the Vietnamese meaning and a very short usage guide (1 sentence).
-            Output strictly in this format:
-            Word || Meaning || Usage Guide
-
-            Example:
-            Serendipity || Sự tình cờ may mắn || Dùng khi tìm thấy điều tốt đẹp không chủ đích.
-            """
-            # [ĐÃ KHÔI PHỤC MODEL CỦA BẠN]
-            res = client.chat.completions.create(messages=[{"role":"user","content":prompt}], model="openai/gpt-oss-120b").choices[0].message.content
-            
-            # Xử lý kết quả trả về
-            count = 0
-            for line in res.split('\n'):
-                if "||" in line:
-                    parts = line.split("||")
-                    if len(parts) >= 3:
-                        w = parts[0].strip()
-                        m = parts[1].strip()
-                        u = parts[2].strip()
-                        full_meaning = f"{m}\n💡 HDSD: {u}"
-                        try:
-                            Vocabulary.get_or_create(word=w, defaults={'meaning': full_meaning})
-                            count += 1
-                        except: pass
-            
-            self.after(0, lambda: [
-                self.txt_vocab_input.delete("1.0", "end"),
-                self.update_stats(),
-                self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)"),
-                messagebox.showinfo("Thành công", f"Đã lưu {count} từ kèm hướng dẫn sử dụng chi tiết!")
-            ])
-
+            count, missing = import_vocab_ai(words, key)
         except Exception as e:
             print(e)
-            # Nếu lỗi thì fallback về Google
-            self.after(0, lambda: [self.save_vocab_fallback(), self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)")])
+            count, missing = 0, words
+
+        def done():
+            self.txt_vocab_input.delete("1.0", "end")
+            self.update_stats()
+            self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)")
+            if missing:
+                # Từ AI không xử lý được -> fallback về Google
+                self.txt_vocab_input.insert("1.0", "\n".join(missing))
+                self.save_vocab_fallback()
+            messagebox.showinfo("Thành công", f"Đã lưu {count} từ kèm hướng dẫn sử dụng chi tiết!")
+        tasks.call_soon(done)
 
     def save_vocab_fallback(self):
         lines = self.txt_vocab_input.get("1.0", "end").split('\n')
-        c = 0
-        for l in lines:
-            w = l.strip()
-            if w:
-                try: 
-                    mean = GoogleTranslator(source='auto', target='vi').translate(w)
-                    Vocabulary.get_or_create(word=w, defaults={'meaning': mean})
-                    c+=1
-                except: pass
+        words = list(dict.fromkeys(l.strip() for l in lines if l.strip()))
+        if not words: return
         self.txt_vocab_input.delete("1.0", "end")
-        self.update_stats()
-        self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)")
-        messagebox.showinfo("OK", f"Đã thêm {c} từ (Google).")
+        self.btn_save_vocab.configure(state="disabled", text="⏳ Đang dịch (Google)...")
+        # Dịch song song ở luồng nền, không đơ UI
+        tasks.submit("network", self._run_save_vocab_fallback, words, key=("save_vocab_fallback",))
+
+    def _run_save_vocab_fallback(self, words):
+        meanings = translator.translate_batch(words, 'auto', 'vi')
+        rows = [{'word': w, 'meaning': m} for w, m in zip(words, meanings) if m]
+        c = insert_many_ignore(Vocabulary, rows)
+        tasks.call_soon(lambda: [
+            self.update_stats(),
+            self.btn_save_vocab.configure(state="normal", text="Lưu & Lấy HDSD (Groq)"),
+            messagebox.showinfo("OK", f"Đã thêm {c} từ (Google).")
+        ])
 
     # ==========================================
     # 6. ÔN CÂU (SENTENCE REVIEW) - CẬP NHẬT VOICE MỚI
@@ -624,19 +2096,28 @@ class EnglishApp(ctk.CTk):
         return frame
 
     def start_sent_session(self):
-        today = datetime.date.today()
-        self.review_queue = list(Sentence.select().where(Sentence.next_review <= today))
+        self.review_queue = ReviewQueue.due(Sentence)
+        prefetcher.cancel_pending()
+        prefetcher.prefetch(item.text for item in self.review_queue.upcoming(PREFETCH_AHEAD))
+        prefetcher.prefetch_due(Sentence, Sentence.text)
+        if self.review_queue and self.get_key():
+            ids = self.review_queue.upcoming_ids(EXPLAIN_SESSION_LIMIT)
+            tasks.submit("network", functools.partial(explain_sentences_batch, ids=ids), key=("explain_batch",))
         if self.review_queue:
-            random.shuffle(self.review_queue)
             self.next_sent()
         else:
             self.lbl_sent_prog.configure(text="Hết bài ôn câu hôm nay!")
             self.lbl_sent_mean.configure(text="")
             self.entry_sent_ans.configure(state="disabled")
 
+    def _answer_latency_ms(self):
+        return int((time.monotonic() - self.card_shown_at) * 1000)
+
     def next_sent(self):
-        if not self.review_queue: self.start_sent_session(); return
-        self.current_item = self.review_queue[0]
+        tasks.advance("card") # Việc của thẻ trước (audio, giải thích) không còn giao về UI
+        self.card_shown_at, self.voice_logprob = time.monotonic(), None
+        self.current_item = self.review_queue.current()
+        if not self.current_item: self.start_sent_session(); return
         self.lbl_sent_prog.configure(text=f"Cần ôn: {len(self.review_queue)}")
         self.entry_sent_ans.configure(state="normal")
         self.entry_sent_ans.delete(0, "end")
@@ -646,69 +2127,72 @@ class EnglishApp(ctk.CTk):
         self.txt_diff.delete("1.0", "end")
         self.btn_sent_next.configure(state="disabled")
         self.after(500, lambda: self.play_audio(self.current_item.text))
+        prefetcher.prefetch(item.text for item in self.review_queue.upcoming(PREFETCH_AHEAD + 1)[1:])
 
     def check_sent(self, event=None):
         if not self.current_item: return
         user = self.entry_sent_ans.get().strip()
         raw = self.current_item.text.strip()
         
-        u_clean = user.replace("’", "'").rstrip('.!?').lower()
-        o_clean = raw.replace("’", "'").rstrip('.!?').lower()
-        ratio = difflib.SequenceMatcher(None, o_clean, u_clean).ratio()
+        # Chuẩn hoá + so khớp theo từ: điểm và diff trong 1 lượt
+        result = score_answer(raw, user)
         
-        self.show_diff(o_clean, u_clean)
-
-        if ratio >= 0.9:
-            self.review_queue.pop(0)
-            self.current_item.level += 1
-            self.current_item.next_review = datetime.date.today() + datetime.timedelta(days=2**(self.current_item.level-1))
-            self.current_item.save()
+        self.show_diff(result)
+
+        passed = result.score >= PASS_THRESHOLD
+        review_card(self.current_item, result.score, passed, logprob=self.voice_logprob,
+                    latency_ms=self._answer_latency_ms())
+        if passed:
+            self.review_queue.pop()
+            self.update_stats()
             self.btn_sent_next.configure(state="normal")
             self.btn_sent_next.focus()
-            threading.Thread(target=self.groq_explain_sentence).start()
+            tasks.submit("network", self.groq_explain_sentence, self.current_item, scope="card",
+                         key=("explain", self.current_item.id), on_done=self._show_sent_meaning)
         else:
-            self.review_queue.append(self.review_queue.pop(0))
-            self.current_item.level = 0
-            self.current_item.next_review = datetime.date.today()
-            self.current_item.save()
+            self.review_queue.requeue()
             self.play_audio(raw)
 
-    def show_diff(self, original, user):
+    def show_diff(self, result):
         self.txt_diff.delete("1.0", "end")
-        matcher = difflib.SequenceMatcher(None, original, user)
-        for opcode, a0, a1, b0, b1 in matcher.get_opcodes():
-            if opcode == 'equal': self.txt_diff.insert("end", original[a0:a1], "correct")
-            elif opcode == 'insert': self.txt_diff.insert("end", user[b0:b1], "wrong")
-            elif opcode == 'delete': self.txt_diff.insert("end", original[a0:a1], "miss")
+        original, user = result.target, result.answer
+        words = lambda tokens: " ".join(tokens) + " "
+        for opcode, a0, a1, b0, b1 in result.opcodes:
+            if opcode == 'equal': self.txt_diff.insert("end", words(original[a0:a1]), "correct")
+            elif opcode == 'insert': self.txt_diff.insert("end", words(user[b0:b1]), "wrong")
+            elif opcode == 'delete': self.txt_diff.insert("end", words(original[a0:a1]), "miss")
             elif opcode == 'replace':
-                self.txt_diff.insert("end", original[a0:a1], "miss")
-                self.txt_diff.insert("end", f"[{user[b0:b1]}]", "wrong")
-
-    def groq_explain_sentence(self):
-        if self.current_item.meaning:
-            self.after(0, lambda: self.lbl_sent_mean.configure(text=self.current_item.meaning))
-            return
+                self.txt_diff.insert("end", words(original[a0:a1]), "miss")
+                self.txt_diff.insert("end", f"[{' '.join(user[b0:b1])}] ", "wrong")
+
+    def _show_sent_meaning(self, text):
+        self.lbl_sent_mean.configure(text=text)
+
+    def groq_explain_sentence(self, item):
+        # Trả về nội dung hiển thị; scheduler bỏ kết quả nếu người học đã sang thẻ khác
+        if not item.meaning:
+            # Có thể vừa được explain_sentences_batch điền ở nền
+            item.meaning = Sentence.select(Sentence.meaning).where(Sentence.id == item.id).scalar()
+        if item.meaning: return item.meaning
         key = self.get_key()
         if key:
             try:
-                self.after(0, lambda: self.lbl_sent_mean.configure(text="⏳ Groq đang phân tích..."))
-                client = Groq(api_key=key)
+                tasks.call_soon(self._show_sent_meaning, "⏳ Groq đang phân tích...")
                 prompt = f"""
-                Dịch và giải thích câu tiếng Anh sau cho người Việt: "{self.current_item.text}"
+                Dịch và giải thích câu tiếng Anh sau cho người Việt: "{item.text}"
                 Format trả về ngắn gọn:
                 - Nghĩa: [Nghĩa tiếng Việt sát nhất]
                 - Ngữ cảnh: [Khi nào dùng, với ai, trang trọng hay không]
                 """
                 # (Yêu cầu 1: Không sửa Model)
-                res = client.chat.completions.create(messages=[{"role":"user","content":prompt}], model="openai/gpt-oss-120b").choices[0].message.content
-                self.current_item.meaning = res
-                self.current_item.save()
-                self.after(0, lambda: self.lbl_sent_mean.configure(text=res))
-            except: 
-                self.after(0, lambda: self.lbl_sent_mean.configure(text="Lỗi Groq API"))
-        else:
-            t = GoogleTranslator(source='en', target='vi').translate(self.current_item.text)
-            self.after(0, lambda: self.lbl_sent_mean.configure(text=t))
+                res = groq_chat(prompt, key)
+                item.meaning = res
+                db_writer.submit(Sentence.update(meaning=res).where(Sentence.id == item.id).execute)
+                return res
+            except Exception as e:
+                print(f"Lỗi Groq API: {e}")
+                return "Lỗi Groq API"
+        return translator.translate(item.text, 'en', 'vi') or "Lỗi Google Translate"
 
     # ==========================================
     # 7. ÔN TỪ (VOCAB REVIEW)
@@ -743,10 +2227,11 @@ class EnglishApp(ctk.CTk):
         return frame
 
     def start_vocab_session(self):
-        today = datetime.date.today()
-        self.review_queue = list(Vocabulary.select().where(Vocabulary.next_review <= today))
+        self.review_queue = ReviewQueue.due(Vocabulary)
+        prefetcher.cancel_pending()
+        prefetcher.prefetch(item.word for item in self.review_queue.upcoming(PREFETCH_AHEAD))
+        prefetcher.prefetch_due(Vocabulary, Vocabulary.word)
         if self.review_queue:
-            random.shuffle(self.review_queue)
             self.next_vocab()
         else:
             self.lbl_vocab_prog.configure(text="Hết từ vựng ôn!")
@@ -754,8 +2239,10 @@ class EnglishApp(ctk.CTk):
             self.entry_vocab_sent.configure(state="disabled")
 
     def next_vocab(self):
-        if not self.review_queue: self.start_vocab_session(); return
-        self.current_item = self.review_queue[0]
+        tasks.advance("card")
+        self.card_shown_at = time.monotonic()
+        self.current_item = self.review_queue.current()
+        if not self.current_item: self.start_vocab_session(); return
         self.lbl_vocab_prog.configure(text=f"Cần ôn: {len(self.review_queue)}")
         self.lbl_vocab_word.configure(text=self.current_item.word)
         self.lbl_vocab_hint.configure(text=self.current_item.meaning)
@@ -767,6 +2254,7 @@ class EnglishApp(ctk.CTk):
         self.btn_save_suggested.configure(state="disabled")
         self.temp_suggested_sentence = ""
         self.after(500, lambda: self.play_audio(self.current_item.word))
+        prefetcher.prefetch(item.word for item in self.review_queue.upcoming(PREFETCH_AHEAD + 1)[1:])
 
     def check_vocab(self, event=None):
         sent = self.entry_vocab_sent.get()
@@ -777,38 +2265,41 @@ class EnglishApp(ctk.CTk):
             return
         
         self.lbl_vocab_feed.configure(text="⏳ Đang chấm điểm...", text_color="yellow")
-        threading.Thread(target=self.groq_check_vocab, args=(self.current_item.word, sent, key)).start()
+        # Enter 2 lần cho cùng 1 từ -> chỉ chấm 1 lần
+        tasks.submit("network", self.groq_check_vocab, self.current_item.word, sent, key, self._answer_latency_ms(),
+                     key=("check_vocab", self.current_item.id), scope="card")
 
-    def groq_check_vocab(self, word, sent, key):
+    def groq_check_vocab(self, word, sent, key, latency_ms=None):
         try:
-            client = Groq(api_key=key)
             # Prompt yêu cầu trả về format có || để dễ cắt chuỗi
             prompt = f"""
             Check sentence using '{word}': '{sent}'. 
             Output strict format: 
             Status (Correct/Incorrect) || Feedback || Better Version (Just the sentence) || Meaning of word
             """
-            res = client.chat.completions.create(messages=[{"role":"user","content":prompt}], model="openai/gpt-oss-120b").choices[0].message.content
+            res = groq_chat(prompt, key)
             
             parts = res.split("||")
             display_text = res.replace("||", "\n")
             
             if len(parts) >= 3:
                 self.temp_suggested_sentence = parts[2].strip()
-                self.after(0, lambda: self.btn_save_suggested.configure(state="normal"))
+                tasks.call_soon(lambda: self.btn_save_suggested.configure(state="normal"))
 
-            self.after(0, lambda: [
+            tasks.call_soon(lambda: [
                 self.lbl_vocab_feed.configure(text=display_text, text_color="white"),
                 self.btn_vocab_next.configure(state="normal"),
                 self.btn_vocab_next.focus()
             ])
             
-            self.review_queue.pop(0)
-            self.current_item.level += 1
-            self.current_item.next_review = datetime.date.today() + datetime.timedelta(days=2**(self.current_item.level-1))
-            self.current_item.save()
+            self.review_queue.pop()
+            # Luôn tính là qua (như trước); câu bị chấm Incorrect thì chất lượng thấp hơn
+            score = 0.6 if "incorrect" in parts[0].lower() else 1.0
+            review_card(self.current_item, score, passed=True, latency_ms=latency_ms)
+            tasks.call_soon(self.update_stats)
         except Exception as e:
-            self.after(0, lambda: self.lbl_vocab_feed.configure(text=f"Lỗi: {e}", text_color="red"))
+            msg = f"Lỗi: {e}" # e bị xoá khi ra khỏi except -> chụp lại trước
+            tasks.call_soon(lambda: self.lbl_vocab_feed.configure(text=msg, text_color="red"))
 
     def save_suggested_sentence(self):
         text_to_save = self.temp_suggested_sentence.strip()
@@ -816,15 +2307,16 @@ class EnglishApp(ctk.CTk):
             messagebox.showwarning("Chú ý", "Không có nội dung để lưu.")
             return
 
-        try:
-            obj, created = Sentence.get_or_create(text=text_to_save)
-            if created:
+        def show_result(inserted):
+            if inserted:
                 messagebox.showinfo("Thành công", f"Đã lưu câu mới vào Dictation:\n\n{text_to_save}")
                 self.btn_save_suggested.configure(state="disabled", text="Đã lưu!")
             else:
                 messagebox.showinfo("Thông báo", "Câu này thực tế ĐÃ CÓ trong kho rồi.")
-        except Exception as e:
-            messagebox.showerror("Lỗi Kỹ Thuật", f"Không lưu được. Chi tiết lỗi:\n{e}")
+
+        tasks.submit("db", insert_many_ignore, Sentence, [{"text": text_to_save}],
+                     key=("save_suggested", text_to_save), on_done=show_result,
+                     on_error=lambda e: messagebox.showerror("Lỗi Kỹ Thuật", f"Không lưu được. Chi tiết lỗi:\n{e}"))
 
     # ==========================================
     # 8. CÀI ĐẶT
@@ -835,9 +2327,98 @@ class EnglishApp(ctk.CTk):
         self.entry_key = ctk.CTkEntry(frame, width=400, show="*")
         self.entry_key.pack(pady=10)
         if self.get_key(): self.entry_key.insert(0, self.get_key())
-        ctk.CTkButton(frame, text="Lưu", command=lambda: [Settings.replace(key="groq", value=self.entry_key.get()).execute(), messagebox.showinfo("OK","Lưu xong")]).pack(pady=10)
+        ctk.CTkButton(frame, text="Lưu", command=self.save_key).pack(pady=10)
+        self.lbl_groq_metrics = ctk.CTkLabel(frame, text="", text_color="gray", justify="left")
+        self.lbl_groq_metrics.pack(pady=5)
+
+        ctk.CTkLabel(frame, text="CACHE ÂM THANH (MB)", font=("Arial", 20)).pack(pady=(30, 10))
+        self.entry_cache_mb = ctk.CTkEntry(frame, width=400)
+        self.entry_cache_mb.pack(pady=10)
+        self.entry_cache_mb.insert(0, str(audio_cache.max_bytes // (1024 * 1024)))
+        self.lbl_cache_stats = ctk.CTkLabel(frame, text="", text_color="gray")
+        self.lbl_cache_stats.pack(pady=5)
+        ctk.CTkButton(frame, text="Lưu & Dọn Cache", command=self.save_cache_budget).pack(pady=10)
+
+        ctk.CTkLabel(frame, text="LỊCH ÔN (SRS)", font=("Arial", 20)).pack(pady=(30, 10))
+        self.opt_srs = ctk.CTkOptionMenu(frame, values=["doubling", "sm2"], command=self.save_srs_strategy)
+        self.opt_srs.set(get_srs_strategy().name)
+        self.opt_srs.pack(pady=10)
+        ctk.CTkButton(frame, text="Dàn đều lịch ôn", command=self.run_rebalance).pack(pady=10)
         return frame
 
+    def save_key(self):
+        tasks.submit("db", save_setting, "groq", self.entry_key.get(),
+                     on_done=lambda _: [groq_clients.invalidate(), messagebox.showinfo("OK", "Lưu xong")],
+                     on_error=lambda e: messagebox.showerror("Lỗi", f"Không lưu được key: {e}"))
+
+    def save_srs_strategy(self, name):
+        tasks.submit("db", save_setting, "srs_strategy", name,
+                     on_error=lambda e: messagebox.showerror("Lỗi", f"Không lưu được lịch ôn: {e}"))
+
+    def run_rebalance(self):
+        tasks.submit("db", rebalance_deck, key=("rebalance",),
+                     on_done=lambda n: [self.update_stats(), messagebox.showinfo("OK", f"Đã dời {n} thẻ.")])
+
+    def save_cache_budget(self):
+        try: mb = float(self.entry_cache_mb.get())
+        except ValueError:
+            messagebox.showerror("Lỗi", "Dung lượng phải là số (MB)!")
+            return
+        def apply_budget():
+            # Lưu + dọn cache + tính báo cáo đều ở luồng nền; UI chỉ hiện kết quả
+            save_setting("audio_cache_max_mb", str(mb))
+            return audio_cache.evict(), audio_cache.report() + "\n" + llm_cache.report()
+        tasks.submit("db", apply_budget, key=("cache_budget",), on_done=self._show_cache_budget,
+                     on_error=lambda e: messagebox.showerror("Lỗi", f"Không dọn được cache: {e}"))
+
+    def _show_cache_budget(self, result):
+        removed, report = result
+        self.lbl_cache_stats.configure(text=report)
+        messagebox.showinfo("OK", f"Đã lưu. Dọn {removed} bản ghi cũ.")
+
 if __name__ == "__main__":
-    app = EnglishApp()
-    app.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Super English Pro")
+    parser.add_argument("--migrate-audio", metavar="DIR", help="Chuyển AudioCache ra kho file DIR rồi thoát")
+    parser.add_argument("--presynth", action="store_true", help="Tạo sẵn audio cho toàn bộ câu/từ chưa có cache rồi thoát")
+    parser.add_argument("--concurrency", type=int, default=4, help="Số request TTS song song (--presynth)")
+    parser.add_argument("--retries", type=int, default=3, help="Số lần thử lại mỗi clip (--presynth)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Tối đa request/giây, 0 = không giới hạn (--presynth)")
+    parser.add_argument("--explain", action="store_true", help="Giải thích (Groq) mọi câu chưa có nghĩa rồi thoát")
+    parser.add_argument("--import-sentences", metavar="FILE", nargs="+", help="Nhập câu từ file .txt/.csv/.jsonl rồi thoát")
+    parser.add_argument("--forecast", metavar="DAYS", type=int, nargs="?", const=FORECAST_DAYS,
+                        help=f"In dự báo số thẻ đến hạn mỗi ngày (mặc định {FORECAST_DAYS} ngày) rồi thoát")
+    parser.add_argument("--rebalance", action="store_true", help="Dàn đều ngày ôn của cả kho rồi thoát")
+    parser.add_argument("--profile-startup", action="store_true", help="Mở app, in thời gian từng giai đoạn khởi động rồi thoát")
+    parser.add_argument("--chunk-size", type=int, default=EXPLAIN_CHUNK_SIZE, help="Số câu mỗi request (--explain)")
+    args = parser.parse_args()
+    if args.forecast is not None and args.forecast < 1: parser.error("--forecast: DAYS phải >= 1")
+
+    if args.migrate_audio:
+        n = migrate_audio_cache_to_store(AudioFileStore(args.migrate_audio))
+        print(f"✅ Xong: {n} clip.")
+    elif args.presynth:
+        done, failed = presynthesize_deck(args.concurrency, args.retries, args.rate)
+        print(f"✅ Xong: {done} clip, {failed} lỗi.")
+    elif args.import_sentences:
+        for path in args.import_sentences:
+            stats = import_sentences(read_sentence_file(path))
+            rate = (stats.inserted + stats.skipped) / stats.seconds if stats.seconds else 0
+            print(f"✅ {path}: thêm {stats.inserted}, bỏ qua {stats.skipped} ({stats.seconds:.2f}s, {rate:.0f} câu/s)")
+    elif args.forecast is not None:
+        print(forecast_report(args.forecast))
+    elif args.rebalance:
+        print(f"✅ Đã dời {rebalance_deck()} thẻ.")
+    elif args.explain:
+        n = explain_sentences_batch(chunk_size=args.chunk_size, concurrency=args.concurrency, due_only=False)
+        print(f"✅ Xong: {n} câu.")
+    elif args.profile_startup:
+        app = EnglishApp()
+        def done():
+            startup_profile.mark("mainloop: tới lúc rảnh đầu tiên")
+            print(startup_profile.report())
+            app.destroy()
+        app.after_idle(done)
+        app.mainloop()
+    else:
+        app = EnglishApp()
+        app.mainloop()
\ No newline at end of file
@@ -0,0 +1,175 @@
+import collections
+import difflib
+import functools
+import re
+
+# ==========================================
+# CHẤM ĐIỂM CÂU THEO TỪ (TOKEN-LEVEL ALIGNMENT)
+# ==========================================
+# Thay difflib theo ký tự: chuẩn hoá dấu câu / viết tắt / số, so khớp theo từ
+# bằng edit distance, trả về điểm + opcodes (định dạng giống difflib) trong 1 lượt.
+# Chi phí tính theo ký tự như tỉ lệ difflib cũ: thiếu/thừa 1 từ trừ độ dài từ đó (kể cả
+# dấu cách), gõ gần đúng ("stor" / "store") chỉ trừ phần ký tự sai. Điểm = 1 - chi phí /
+# tổng độ dài 2 câu, nên ngưỡng 0.9 giữ nguyên ý nghĩa của thang điểm cũ.
+
+PASS_THRESHOLD = 0.9
+NEAR_MISS_MIN_RATIO = 0.5 # Dưới mức này coi như sai hẳn từ
+
+Score = collections.namedtuple("Score", "score opcodes target answer")
+
+_IRREGULAR = {"won't": "will not", "can't": "can not", "cannot": "can not", "shan't": "shall not",
+              "ain't": "is not", "let's": "let us", "y'all": "you all"}
+_SUFFIXES = (("n't", " not"), ("'re", " are"), ("'m", " am"), ("'ll", " will"), ("'ve", " have"), ("'d", " would"))
+# 's chỉ mở rộng khi chắc chắn là "is" (tránh sở hữu cách: "Tom's book")
+_IS_SUBJECTS = {"it", "that", "what", "there", "here", "he", "she", "who", "where", "how", "this"}
+_UNITS = {w: i for i, w in enumerate("zero one two three four five six seven eight nine ten eleven twelve "
+                                     "thirteen fourteen fifteen sixteen seventeen eighteen nineteen".split())}
+_TENS = {w: (i + 2) * 10 for i, w in enumerate("twenty thirty forty fifty sixty seventy eighty ninety".split())}
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def _expand(token):
+    if token in _IRREGULAR: return _IRREGULAR[token].split()
+    for suffix, full in _SUFFIXES:
+        if token.endswith(suffix) and len(token) > len(suffix):
+            return (token[:-len(suffix)] + full).split()
+    if token.endswith("'s") and token[:-2] in _IS_SUBJECTS:
+        return [token[:-2], "is"]
+    return [token]
+
+def _numbers(tokens):
+    # "twenty one" -> "21", "seven" -> "7"; số viết bằng chữ số giữ nguyên
+    out, i = [], 0
+    while i < len(tokens):
+        t = tokens[i]
+        if t in _TENS:
+            value = _TENS[t]
+            if i + 1 < len(tokens) and tokens[i + 1] in _UNITS and 0 < _UNITS[tokens[i + 1]] < 10:
+                value += _UNITS[tokens[i + 1]]
+                i += 1
+            out.append(str(value))
+        elif t in _UNITS:
+            out.append(str(_UNITS[t]))
+        else:
+            out.append(t)
+        i += 1
+    return out
+
+@functools.lru_cache(maxsize=4096)
+def normalize(text):
+    text = text.lower().replace("’", "'").replace("‘", "'")
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text) # 1,000 -> 1000
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        tokens.extend(_expand(token))
+    return tuple(_numbers(tokens))
+
+def token_weight(token):
+    # Số ký tự của từ + 1 dấu cách: chi phí thêm/bớt nguyên từ
+    return len(token) + 1
+
+@functools.lru_cache(maxsize=65536)
+def token_cost(a, b):
+    """Chi phí thay từ a bằng b (theo ký tự): 0 nếu giống, số ký tự lệch nếu gần giống,
+    bằng xoá a + thêm b nếu khác hẳn (hoặc là số)."""
+    if a == b: return 0.0
+    full = float(token_weight(a) + token_weight(b))
+    if a.isdigit() or b.isdigit(): return full # 20 vs 21: sai số là sai hẳn
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    # ratio = 2*khớp/(la+lb) -> số ký tự phải thêm/xoá = (1 - ratio) * (la+lb)
+    return (1.0 - ratio) * (len(a) + len(b)) if ratio >= NEAR_MISS_MIN_RATIO else full
+
+def align(a, b, cost=token_cost, weight=token_weight):
+    """Edit distance theo token, chi phí tính theo ký tự + opcodes (equal/replace/delete/insert)."""
+    n, m = len(a), len(b)
+    wa, wb = [weight(t) for t in a], [weight(t) for t in b]
+    # dp[i][j] = khoảng cách giữa a[:i] và b[:j]
+    first = [0.0]
+    for w in wb: first.append(first[-1] + w)
+    dp = [first]
+    for i in range(1, n + 1):
+        prev = dp[-1]
+        row = [prev[0] + wa[i - 1]] + [0.0] * m
+        ai = a[i - 1]
+        for j in range(1, m + 1):
+            bj = b[j - 1]
+            row[j] = prev[j - 1] if ai == bj else min(prev[j - 1] + cost(ai, bj),
+                                                      prev[j] + wa[i - 1], row[j - 1] + wb[j - 1])
+        dp.append(row)
+
+    # Truy vết từ cuối, gộp các bước liền nhau cùng loại
+    steps, i, j = [], n, m
+    while i or j:
+        if i and j and a[i - 1] == b[j - 1] and dp[i][j] == dp[i - 1][j - 1]:
+            steps.append(("equal", i - 1, i, j - 1, j)); i -= 1; j -= 1
+        elif i and j and dp[i][j] == dp[i - 1][j - 1] + cost(a[i - 1], b[j - 1]):
+            # Hoà chi phí với xoá + thêm thì ưu tiên hiện là "thay từ"
+            steps.append(("replace", i - 1, i, j - 1, j)); i -= 1; j -= 1
+        elif j and dp[i][j] == dp[i][j - 1] + wb[j - 1]:
+            steps.append(("insert", i, i, j - 1, j)); j -= 1
+        else:
+            steps.append(("delete", i - 1, i, j, j)); i -= 1
+    opcodes = []
+    for tag, a0, a1, b0, b1 in reversed(steps):
+        if opcodes and opcodes[-1][0] == tag:
+            opcodes[-1] = (tag, opcodes[-1][1], a1, opcodes[-1][3], b1)
+        else:
+            opcodes.append((tag, a0, a1, b0, b1))
+    return dp[n][m], opcodes
+
+def _score(a, b):
+    distance, opcodes = align(a, b)
+    total = sum(map(token_weight, a)) + sum(map(token_weight, b))
+    return Score(1.0 - distance / total if total else 1.0, opcodes, a, b)
+
+def score_answer(target, answer):
+    return _score(normalize(target), normalize(answer))
+
+def score_batch(pairs):
+    """Chấm nhiều cặp (target, answer); cặp trùng (sau chuẩn hoá) chỉ chấm 1 lần.
+
+    Không phải DP vector hoá: lợi ích chỉ đến từ bỏ trùng + cache chuẩn hoá/chi phí từ.
+    """
+    results, seen = [], {}
+    for target, answer in pairs:
+        key = (normalize(target), normalize(answer))
+        if key not in seen: seen[key] = _score(*key)
+        results.append(seen[key])
+    return results
+
+# ==========================================
+# MICRO-BENCHMARK: python scoring.py
+# ==========================================
+def _difflib_path(target, answer):
+    # Đúng như check_sent cũ: 2 lần SequenceMatcher theo ký tự
+    import difflib
+    o = target.replace("’", "'").rstrip('.!?').lower()
+    u = answer.replace("’", "'").rstrip('.!?').lower()
+    ratio = difflib.SequenceMatcher(None, o, u).ratio()
+    return ratio, difflib.SequenceMatcher(None, o, u).get_opcodes()
+
+def _bench():
+    import random
+    import timeit
+    rng = random.Random(0)
+    words = ("the quick brown fox jumps over lazy dog I am learning to speak English with confidence "
+             "where is nearest coffee shop practice makes perfect we don't have twenty one apples").split()
+    pairs = []
+    for _ in range(500):
+        target = " ".join(rng.choice(words) for _ in range(rng.randint(5, 40)))
+        tokens = target.split()
+        for _ in range(rng.randint(0, 3)):
+            tokens[rng.randrange(len(tokens))] = rng.choice(words)
+        pairs.append((target + ".", " ".join(tokens)))
+
+    def run(fn):
+        normalize.cache_clear()
+        token_cost.cache_clear()
+        return min(timeit.repeat(fn, number=1, repeat=5)) * 1000
+
+    print(f"{len(pairs)} cặp câu (5-40 từ):")
+    print(f"  difflib (ký tự, 2 lượt): {run(lambda: [_difflib_path(t, a) for t, a in pairs]):8.1f} ms")
+    print(f"  score_answer (token):    {run(lambda: [score_answer(t, a) for t, a in pairs]):8.1f} ms")
+    print(f"  score_batch (token):     {run(lambda: score_batch(pairs)):8.1f} ms")
+
+if __name__ == "__main__":
+    _bench()
@@ -0,0 +1,93 @@
+import collections
+import datetime
+
+# ==========================================
+# LỊCH ÔN TẬP (SPACED REPETITION) - THUẦN LOGIC, KHÔNG ĐỤNG DB
+# ==========================================
+# Mỗi chiến lược nhận trạng thái thẻ + chất lượng câu trả lời (0-5, >= 3 là qua)
+# và trả về trạng thái mới. review.py lo phần đọc/ghi DB.
+
+CardState = collections.namedtuple("CardState", "level interval ease due") # interval: số ngày
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+PASS_QUALITY = 3
+
+def quality_from_score(score, passed):
+    """Điểm 0..1 -> chất lượng SM-2 (0..5); qua thì ít nhất 3, trượt thì nhiều nhất 2."""
+    q = int(round(max(0.0, min(1.0, score)) * 5))
+    return max(PASS_QUALITY, q) if passed else min(PASS_QUALITY - 1, q)
+
+class SchedulingStrategy:
+    name = "base"
+
+    def review(self, state, quality, today=None):
+        raise NotImplementedError
+
+    def _relearn(self, state, today, ease=None):
+        # Trượt: về level 0, ôn lại ngay hôm nay
+        return CardState(0, 0, state.ease if ease is None else ease, today)
+
+class DoublingStrategy(SchedulingStrategy):
+    """Luật gốc của app: qua thì khoảng cách 1, 2, 4, 8... ngày; trượt thì về 0."""
+    name = "doubling"
+
+    def review(self, state, quality, today=None):
+        today = today or datetime.date.today()
+        if quality < PASS_QUALITY: return self._relearn(state, today)
+        level = state.level + 1
+        interval = 2 ** (level - 1)
+        return CardState(level, interval, state.ease, today + datetime.timedelta(days=interval))
+
+class SM2Strategy(SchedulingStrategy):
+    """SuperMemo-2: mỗi thẻ có hệ số dễ (ease) riêng, khoảng cách 1, 6, rồi nhân với ease."""
+    name = "sm2"
+
+    def review(self, state, quality, today=None):
+        today = today or datetime.date.today()
+        ease = state.ease or DEFAULT_EASE
+        ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        if quality < PASS_QUALITY: return self._relearn(state, today, ease)
+        level = state.level + 1
+        if level == 1: interval = 1
+        elif level == 2: interval = 6
+        else:
+            # Thẻ cũ (chưa có interval) -> suy ra từ luật nhân đôi
+            previous = state.interval or 2 ** max(0, state.level - 1)
+            interval = max(previous + 1, int(round(previous * ease)))
+        return CardState(level, interval, ease, today + datetime.timedelta(days=interval))
+
+def make_strategy(name):
+    strategies = {cls.name: cls for cls in (DoublingStrategy, SM2Strategy)}
+    if name not in strategies:
+        raise ValueError(f"Chiến lược SRS không hợp lệ: {name} (chọn: {', '.join(strategies)})")
+    return strategies[name]()
+
+# ==========================================
+# DÀN ĐỀU LỊCH ÔN (REBALANCE) CHO CẢ KHO TRONG 1 LƯỢT
+# ==========================================
+REBALANCE_FUZZ = 0.1      # Được dời tối đa 10% khoảng cách của thẻ
+REBALANCE_MAX_SHIFT = 7   # ... và không quá 7 ngày
+
+def rebalance(cards, today=None, fuzz=REBALANCE_FUZZ, max_shift=REBALANCE_MAX_SHIFT):
+    """cards: iterable (id, due, interval). Trả về {id: due mới} cho các thẻ cần dời.
+
+    Thẻ khoảng cách dài được dời trong cửa sổ ±fuzz*interval sang ngày đang ít thẻ nhất,
+    nên các "đỉnh" (nhiều thẻ dồn 1 ngày) được san ra các ngày lân cận. Thẻ đã đến hạn giữ nguyên.
+    """
+    today = today or datetime.date.today()
+    cards = [(card_id, due, interval) for card_id, due, interval in cards]
+    load = collections.Counter(due for _, due, _ in cards)
+    moved = {}
+    # Thẻ khoảng cách dài nhất linh hoạt nhất -> xếp sau cùng để lấp chỗ trống
+    for card_id, due, interval in sorted(cards, key=lambda c: (c[2], c[1])):
+        shift = min(max_shift, int((interval or 0) * fuzz))
+        if shift <= 0 or due <= today: continue
+        window = [due + datetime.timedelta(days=d) for d in range(-shift, shift + 1)]
+        window = [day for day in window if day > today]
+        best = min(window, key=lambda day: (load[day] - (day == due), abs((day - due).days)))
+        if best != due:
+            load[due] -= 1
+            load[best] += 1
+            moved[card_id] = best
+    return moved
@@ -0,0 +1,91 @@
+import collections
+import contextlib
+
+# ==========================================
+# BACKEND NHẬN DẠNG GIỌNG NÓI (SPEECH-TO-TEXT)
+# ==========================================
+# upload luôn là tuple (tên file, file-like) như audio_capture.encode_audio trả về.
+Transcript = collections.namedtuple("Transcript", "text avg_logprob no_speech_prob")
+
+class TranscriptionBackend:
+    name = "base"
+
+    def transcribe(self, upload, prompt=None):
+        raise NotImplementedError
+
+class GroqWhisperBackend(TranscriptionBackend):
+    """Gọi Groq Whisper qua mạng. client_factory() trả về client Groq (dùng chung được)."""
+    name = "groq"
+
+    def __init__(self, client_factory, model="whisper-large-v3-turbo", timer=None):
+        self.client_factory = client_factory
+        self.model = model
+        self.timer = timer or (lambda endpoint: contextlib.nullcontext())
+
+    def transcribe(self, upload, prompt=None):
+        extra = {"prompt": prompt} if prompt else {}
+        with self.timer("transcription"):
+            result = self.client_factory().audio.transcriptions.create(
+                file=upload,
+                model=self.model,
+                language="en",
+                response_format="verbose_json",
+                temperature=0.0,
+                **extra
+            )
+        segments = getattr(result, 'segments', None) or []
+        probs = [seg['avg_logprob'] for seg in segments]
+        return Transcript(
+            text=result.text.strip(),
+            avg_logprob=sum(probs) / len(probs) if probs else 0,
+            no_speech_prob=segments[0].get('no_speech_prob', 0) if segments else 0,
+        )
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """Whisper chạy CPU bằng faster-whisper (CTranslate2, lượng tử hoá int8). Model nạp lần đầu dùng."""
+    name = "local"
+
+    def __init__(self, model_size="base.en", compute_type="int8", threads=0):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.threads = threads
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            from faster_whisper import WhisperModel # pip install faster-whisper (tuỳ chọn)
+            self._model = WhisperModel(self.model_size, device="cpu",
+                                       compute_type=self.compute_type, cpu_threads=self.threads)
+        return self._model
+
+    def transcribe(self, upload, prompt=None):
+        _, fileobj = upload
+        fileobj.seek(0)
+        segments, _ = self._load().transcribe(fileobj, language="en", beam_size=1,
+                                              temperature=0.0, initial_prompt=prompt)
+        segments = list(segments)
+        probs = [seg.avg_logprob for seg in segments]
+        return Transcript(
+            text=" ".join(seg.text.strip() for seg in segments).strip(),
+            avg_logprob=sum(probs) / len(probs) if probs else 0,
+            no_speech_prob=segments[0].no_speech_prob if segments else 1.0,
+        )
+
+class StubBackend(TranscriptionBackend):
+    """Kết quả cố định theo tên file (hoặc `default`), không cần mạng/model: dùng để test."""
+    name = "stub"
+
+    def __init__(self, responses=None, default="", avg_logprob=-0.1):
+        self.responses = responses or {}
+        self.default = default
+        self.avg_logprob = avg_logprob
+
+    def transcribe(self, upload, prompt=None):
+        text = self.responses.get(upload[0], self.default)
+        return Transcript(text=text, avg_logprob=self.avg_logprob, no_speech_prob=0.0 if text else 1.0)
+
+def make_backend(name, **kwargs):
+    backends = {cls.name: cls for cls in (GroqWhisperBackend, LocalWhisperBackend, StubBackend)}
+    if name not in backends:
+        raise ValueError(f"Backend STT không hợp lệ: {name} (chọn: {', '.join(backends)})")
+    return backends[name](**kwargs)
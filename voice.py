@@ -1,16 +1,17 @@
 import customtkinter as ctk
 import threading
 import pyaudio
-import wave
-import os
-import tempfile
-import difflib
 from groq import Groq
+from audio_capture import VoiceActivityRecorder, encode_audio
+from stt_backends import make_backend
+from scoring import score_answer
 
 # --- CẤU HÌNH AUDIO & GROQ ---
 AUDIO_RATE = 16000     # Chuẩn của Groq
 AUDIO_CHANNELS = 1     # Mono
 AUDIO_CHUNK = 1024
+STT_BACKEND = "groq"   # "groq" | "local" (faster-whisper chạy CPU, không cần API Key)
+UPLOAD_FORMAT = "flac" # "wav" | "flac" | "opus" (flac/opus cần soundfile, thiếu thì tự về wav)
 
 # Cấu hình giao diện
 ctk.set_appearance_mode("Dark")  # Chế độ tối
@@ -27,8 +28,9 @@ class EnglishTutorApp(ctk.CTk):
 
         # Biến trạng thái
         self.is_recording = False
-        self.frames = []
+        self.pcm = memoryview(b"")
         self.api_key = ""
+        self.stt = None
         
         # Data mẫu
         self.sentences = [
@@ -105,7 +107,7 @@ class EnglishTutorApp(ctk.CTk):
     def toggle_recording(self):
         # Kiểm tra API Key
         self.api_key = self.entry_api.get().strip()
-        if not self.api_key:
+        if STT_BACKEND == "groq" and not self.api_key:
             self.lbl_status.configure(text="❌ Lỗi: Vui lòng nhập API Key!", text_color="#FF5555")
             return
 
@@ -134,57 +136,55 @@ class EnglishTutorApp(ctk.CTk):
         stream = p.open(format=pyaudio.paInt16, channels=AUDIO_CHANNELS,
                         rate=AUDIO_RATE, input=True, frames_per_buffer=AUDIO_CHUNK)
         
-        self.frames = []
+        recorder = VoiceActivityRecorder(AUDIO_RATE, AUDIO_CHUNK)
         while self.is_recording:
-            data = stream.read(AUDIO_CHUNK)
-            self.frames.append(data)
+            data = stream.read(AUDIO_CHUNK, exception_on_overflow=False)
+            if not recorder.feed(data): break # Im lặng đủ lâu sau khi nói -> tự dừng
 
         stream.stop_stream()
         stream.close()
         p.terminate()
 
+        if self.is_recording:
+            self.is_recording = False
+            self.after(0, lambda: [self.btn_record.configure(state="disabled", text="⏳ Đang xử lý..."),
+                                   self.lbl_status.configure(text="Đang gửi dữ liệu lên Groq...", text_color="#4CAF50")])
+
+        if not recorder.has_speech:
+            self.after(0, lambda: self.lbl_status.configure(text="❌ Không nghe thấy gì, thử lại nhé!", text_color="#FF5555"))
+            self.after(0, self.reset_button)
+            return
+
         # Lưu file tạm và gọi API
+        self.pcm = recorder.pcm()
         self.save_and_process_audio()
 
     def save_and_process_audio(self):
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        wf = wave.open(temp_file.name, 'wb')
-        wf.setnchannels(AUDIO_CHANNELS)
-        wf.setsampwidth(2) # 16 bit
-        wf.setframerate(AUDIO_RATE)
-        wf.writeframes(b''.join(self.frames))
-        wf.close()
+        # Đóng gói ngay trong RAM, không ghi file tạm
+        upload = encode_audio(self.pcm, AUDIO_RATE, AUDIO_CHANNELS, UPLOAD_FORMAT)
 
         # Chuyển sang xử lý API (trên luồng khác để không đơ UI)
-        threading.Thread(target=self.run_api_analysis, args=(temp_file.name,), daemon=True).start()
+        threading.Thread(target=self.run_api_analysis, args=(upload,), daemon=True).start()
 
-    def run_api_analysis(self, file_path):
+    def run_api_analysis(self, upload):
         try:
-            client = Groq(api_key=self.api_key)
+            if STT_BACKEND == "groq":
+                client = Groq(api_key=self.api_key)
+                self.stt = make_backend("groq", client_factory=lambda: client)
+            elif self.stt is None: # Model local chỉ nạp 1 lần
+                self.stt = make_backend(STT_BACKEND)
             target_text = self.combo_sentences.get()
 
-            with open(file_path, "rb") as file:
-                transcription = client.audio.transcriptions.create(
-                    file=file,
-                    model="whisper-large-v3-turbo",
-                    language="en",
-                    prompt=target_text, # Context
-                    response_format="verbose_json",
-                    temperature=0.0
-                )
+            transcription = self.stt.transcribe(upload, prompt=target_text) # Context
 
             # Phân tích kết quả
-            user_text = transcription.text.strip()
+            user_text = transcription.text
             
             # Tính Confidence (avg_logprob)
-            avg_logprob = 0
-            if hasattr(transcription, 'segments') and transcription.segments:
-                probs = [seg['avg_logprob'] for seg in transcription.segments]
-                avg_logprob = sum(probs) / len(probs) if probs else 0
+            avg_logprob = transcription.avg_logprob
 
             # Tính điểm giống nhau
-            matcher = difflib.SequenceMatcher(None, target_text.lower().strip(), user_text.lower().strip())
-            score = matcher.ratio() * 100
+            score = score_answer(target_text, user_text).score * 100
 
             # Cập nhật UI (phải dùng self.after để thread-safe trong Tkinter)
             self.after(0, self.display_results, user_text, score, avg_logprob)
@@ -195,8 +195,6 @@ class EnglishTutorApp(ctk.CTk):
             err_msg = str(e) 
             self.after(0, lambda: self.lbl_status.configure(text=f"Lỗi: {err_msg}", text_color="#FF5555"))
         finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
             self.after(0, self.reset_button)
 
     def display_results(self, text, score, logprob):